@@ -6,9 +6,15 @@ import os
 
 from .routers import robots as robots_router
 from .routers.spot import router as spot_router   # Samlet Spot-router (__init__.py)
+from .services.spot_async import loop_lag
 
 app = FastAPI(title="Robot Hub")
 
+@app.on_event("startup")
+async def start_background_monitors():
+    # Måler event-loop lag så vi kan se om noget blokerer loopet
+    loop_lag.start()
+
 # Frontend sti
 frontend_dir = os.path.join(os.path.dirname(__file__), "..", "frontend")
 app.mount("/static", StaticFiles(directory=os.path.join(frontend_dir, "static")), name="static")
@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from . import spot, status, stream, perception, spot_battery, visualizer_runner
+from . import spot, status, stream, perception, spot_battery, visualizer_runner, telemetry, jobs, visualizer, events
 
 # Saml alle Spot-relaterede endpoints under ét prefix
 router = APIRouter(prefix="/api/robots/spot-001", tags=["spot"])
@@ -9,4 +9,8 @@ router.include_router(status.router)      # /status
 router.include_router(stream.router)      # /stream/...
 router.include_router(perception.router)  # /perception/...
 router.include_router(spot_battery.router)  # /battery
-router.include_router(visualizer_runner.router)  # /launch-visualizer
\ No newline at end of file
+router.include_router(visualizer_runner.router)  # /launch-visualizer
+router.include_router(visualizer.router)  # /visualizer (websocket)
+router.include_router(telemetry.router)  # /telemetry (SSE)
+router.include_router(events.router)     # /events (websocket: telemetry + jobs)
+router.include_router(jobs.router)       # /jobs/...
@@ -0,0 +1,39 @@
+# backend/routers/spot/events.py
+from __future__ import annotations
+from typing import AsyncIterator, Optional
+import asyncio
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+
+from ...services.spot_singleton import command_scheduler, telemetry_hub
+
+router = APIRouter()
+
+
+@router.websocket("/events")
+async def events_ws(ws: WebSocket):
+    """Én websocket pr. fane med alle push-beskeder som JSON med et `type` felt.
+
+    WebSockets tæller ikke med i browserens 6 HTTP/1.1 forbindelser pr. host,
+    så de fem MJPEG streams + kontrol-fetches ikke blokeres.
+    """
+    await ws.accept()
+    send_lock = asyncio.Lock()
+
+    async def pump(messages: AsyncIterator[Optional[str]]):
+        async for payload in messages:
+            async with send_lock:
+                await ws.send_text(payload)
+
+    tasks = [
+        asyncio.create_task(pump(telemetry_hub.subscribe(keepalive=None))),
+        asyncio.create_task(pump(command_scheduler.events(keepalive=None))),
+    ]
+    try:
+        while True:
+            await ws.receive_text()     # klienten sender intet; vi venter bare på disconnect
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
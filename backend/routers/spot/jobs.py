@@ -0,0 +1,39 @@
+# backend/routers/spot/jobs.py
+from __future__ import annotations
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from ...services.spot_singleton import command_scheduler
+from ...services.telemetry import sse
+
+router = APIRouter()
+
+
+@router.get("/jobs")
+async def list_jobs():
+    """Seneste kommando-jobs (nyeste sidst) + køens tilstand."""
+    return {"jobs": [job.to_dict() for job in command_scheduler.jobs()], "scheduler": command_scheduler.stats()}
+
+
+@router.get("/jobs/events")
+async def job_events():
+    """Server-Sent Events: én `job` besked pr. statusændring (browseren bruger /events)."""
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(sse(command_scheduler.events(), "job"), media_type="text/event-stream", headers=headers)
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = command_scheduler.get(job_id)
+    if job is None:
+        return JSONResponse(content={"error": "not_found"}, status_code=404)
+    return job.to_dict()
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Annullér et job i kø eller afbryd et kørende coroutine-job (fx hello)."""
+    job = command_scheduler.cancel(job_id)
+    if job is None:
+        return JSONResponse(content={"error": "not_found"}, status_code=404)
+    return job.to_dict()
@@ -1,19 +1,34 @@
 # backend/routers/spot/perception.py
 from __future__ import annotations
+from typing import Optional
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from fastapi.responses import JSONResponse
 
-from ...services.spot_singleton import spot_client  
+from ...services.spot_singleton import perception_hub
+from ...services.perception_hub import FORMAT_BINARY, FORMAT_JSON
 
-router = APIRouter(prefix="/api/robots/spot-001", tags=["spot"])
+router = APIRouter()
+
+# Klienter kan også forhandle det binære format via Sec-WebSocket-Protocol
+BINARY_SUBPROTOCOL = "spot-perception.v1"
 
 
 @router.websocket("/perception")
-async def perception_ws(ws: WebSocket):
-    await ws.accept()
+async def perception_ws(ws: WebSocket, format: Optional[str] = None):
+    """Perception bokse. `?format=binary` (eller subprotokollen) giver keyframes + deltas."""
+    subprotocol = BINARY_SUBPROTOCOL if BINARY_SUBPROTOCOL in ws.scope.get("subprotocols", []) else None
+    fmt = FORMAT_BINARY if format == FORMAT_BINARY or subprotocol else FORMAT_JSON
+    await ws.accept(subprotocol=subprotocol)
     try:
-        async for msg in spot_client.perception_stream():
-            await ws.send_json(msg)
+        async for data in perception_hub.subscribe(fmt):
+            if fmt == FORMAT_BINARY:
+                await ws.send_bytes(data)
+            else:
+                await ws.send_text(data)
     except WebSocketDisconnect:
         pass
+
+
+@router.get("/perception/stats")
+async def perception_stats():
+    return perception_hub.stats()
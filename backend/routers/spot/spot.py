@@ -2,96 +2,74 @@
 from __future__ import annotations
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
-from fastapi.concurrency import run_in_threadpool   # Importeret så vi kan køre blokkerende kode i en tråd
 
-from ...services.spot_singleton import spot_client  # fælles client, Singleton :))
+from ...services.spot_singleton import spot_client, command_scheduler  # fælles client, Singleton :))
 
 router = APIRouter()
 
 
-@router.post("/demo/hello")
-async def hello_demo():
-    """Endpoint til 'Hello Spot' demo."""
+def _submit(action: str, method: str, preempt: bool = False):
+    """Læg en demo i kommando-køen og svar med det samme med job-id'et.
+
+    Selve kommandoen kører i robottens egen kommando-tråd; følg den via
+    GET /jobs/{id} eller /events websocket'en. Stop-kommandoer (`preempt`)
+    afbryder det kørende job og springer forrest i køen.
+    """
     try:
-        # kør hello_spot i baggrundstråd så det ikke blokerer video-streamen
-        msg = await run_in_threadpool(spot_client.hello_spot)
-        return {"status": "ok", "message": msg}
+        job = command_scheduler.submit(action, getattr(spot_client, method), preempt=preempt)
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
+    return JSONResponse(
+        content={"status": job.status, "job_id": job.id, "message": f"{action} sat i kø"},
+        status_code=202,
+    )
+
+
+@router.post("/demo/hello")
+async def hello_demo():
+    """Endpoint til 'Hello Spot' demo."""
+    return _submit("hello", "hello_spot")
 
 
 @router.post("/demo/lay")
 async def lay_demo():
     """Endpoint til at lægge Spot ned (sit)."""
-    try:
-        msg = await run_in_threadpool(spot_client.lay_down)
-        return {"status": "ok", "message": msg}
-    except Exception as e:
-        return JSONResponse(content={"error": str(e)}, status_code=500)
+    return _submit("lay", "lay_down", preempt=True)
 
 
 @router.post("/demo/poweroff")
 async def poweroff_demo():
     """Endpoint til at slukke Spot (power off)."""
-    try:
-        msg = await run_in_threadpool(spot_client.power_off)
-        return {"status": "ok", "message": msg}
-    except Exception as e:
-        return JSONResponse(content={"error": str(e)}, status_code=500)
+    return _submit("poweroff", "power_off", preempt=True)
 
 @router.post("/demo/poweron")
 async def poweron_demo():
     """Endpoint til at tænde Spot (power on)."""
-    try:
-        msg = await run_in_threadpool(spot_client.power_on)
-        return {"status": "ok", "message": msg}
-    except Exception as e:
-        return JSONResponse(content={"error": str(e)}, status_code=500)
+    return _submit("poweron", "power_on")
     
 
 @router.post("/demo/rollover")
 async def rollover_demo():
     """Endpoint til at rulle Spot over."""
-    try:
-        msg = await run_in_threadpool(spot_client.roll_over)
-        return {"status": "ok", "message": msg}
-    except Exception as e:
-        return JSONResponse(content={"error": str(e)}, status_code=500)
+    return _submit("rollover", "roll_over")
 
 @router.post("/demo/stand")
 async def stand_demo():
     """Endpoint til at få Spot til at stå op."""
-    try:
-        msg = await run_in_threadpool(spot_client.stand_up)
-        return {"status": "ok", "message": msg}
-    except Exception as e:
-        return JSONResponse(content={"error": str(e)}, status_code=500)
+    return _submit("stand", "stand_up")
 
 @router.post("/demo/fiducial")
 async def fiducial_demo():
     """Endpoint til at få Spot til at følge et fiducial marker."""
-    try:
-        msg = await run_in_threadpool(spot_client.fiducial_follow)
-        return {"status": "ok", "message": msg}
-    except Exception as e:
-        return JSONResponse(content={"error": str(e)}, status_code=500)
+    return _submit("fiducial", "fiducial_follow")
     
 @router.post("/demo/fiducialstop")
 async def fiducialstop_demo():
     """Stopper fiducial following uden at stoppe hele appen."""
-    try:
-        msg = await run_in_threadpool(spot_client.fiducial_stop)
-        return {"status": "ok", "message": msg}
-    except Exception as e:
-        return JSONResponse(content={"error": str(e)}, status_code=500)
+    return _submit("fiducialstop", "fiducial_stop", preempt=True)
 
     
 @router.post("/demo/selfright")
 async def selfright_demo():
     """Endpoint til at få Spot til at self-right."""
-    try:
-        msg = await run_in_threadpool(spot_client.selfright)
-        return {"status": "ok", "message": msg}
-    except Exception as e:
-        return JSONResponse(content={"error": str(e)}, status_code=500)
-    
+    return _submit("selfright", "selfright")
@@ -3,19 +3,27 @@ from fastapi import APIRouter
 from fastapi.responses import JSONResponse
 from ...config import USE_FAKE_SPOT, SPOT_CONFIG
 from ...services.spot_singleton import spot_client
+from ...services.spot_async import loop_lag
 
 router = APIRouter()
 
 @router.get("/status")
 async def get_status():
     try:
-        if USE_FAKE_SPOT:
-            # Fake client: altid online
-            return {"online": True, "ip": "fake"}
-        else:
-            # RealSpotClient: check via robot objektet
-            ip = SPOT_CONFIG["hostname"]
-            online = spot_client.robot.is_estopped() is not None  # simpel sanity-check
-            return {"online": True, "ip": ip}
+        # Læses fra robot-state snapshottet (baggrunds-sampler) – ingen RPC her
+        state = spot_client.state_snapshot()
+        ip = "fake" if USE_FAKE_SPOT else SPOT_CONFIG["hostname"]
+        return {
+            "online": state["online"],
+            "ip": ip,
+            "power": state.get("power"),
+            "estopped": (state.get("estop") or {}).get("estopped"),
+            "state_age_s": state.get("age_s"),
+        }
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
+
+@router.get("/status/loop")
+async def get_loop_lag():
+    """Event-loop lag (ms) – stiger hvis noget blokerer loopet."""
+    return loop_lag.stats()
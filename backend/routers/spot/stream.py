@@ -1,20 +1,63 @@
 # backend/routers/spot/stream.py
 from __future__ import annotations
-from fastapi import APIRouter
-from fastapi.responses import StreamingResponse
-from ...services.spot_singleton import spot_client  # Bruger singleton :)
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from ...services.spot_singleton import frame_hub  # Delt broadcaster ovenpå singleton :)
+from ...services.frame_hub import MOSAIC
+from ...services.frames import Rendition
 
 router = APIRouter()
 
 BOUNDARY = "frame"
 
-def make_stream_response(camera: str):
+# Korte navne i URL'erne -> Spot kamera sources
+CAMERAS = {
+    "frontleft": "frontleft_fisheye_image",
+    "frontright": "frontright_fisheye_image",
+    "left": "left_fisheye_image",
+    "right": "right_fisheye_image",
+    "back": "back_fisheye_image",
+    "mosaic": MOSAIC,
+}
+
+
+class StreamParams:
+    """Valgfri pr.-forbindelse parametre: ?fps=5&max_latency_ms=500&width=320&quality=50&gray=1
+
+    width/quality snappes til en lille stige af renditions (se services/frames.py),
+    så tablets kan hente en lille stream uden en fuld encode pr. viewer.
+    """
+
+    def __init__(
+        self,
+        fps: Optional[float] = Query(None, gt=0, le=30, description="Max frames/sek. for denne forbindelse"),
+        max_latency_ms: Optional[float] = Query(None, gt=0, description="Drop frames ældre end dette (ms)"),
+        width: Optional[int] = Query(None, gt=0, description="Ønsket bredde i pixels"),
+        quality: Optional[int] = Query(None, ge=1, le=100, description="JPEG kvalitet"),
+        gray: bool = Query(False, description="Gråtoner"),
+    ):
+        self.fps = fps
+        self.max_latency_ms = max_latency_ms
+        self.rendition = Rendition.pick(width, quality, gray)
+
+
+def make_stream_response(camera: str, params: Optional[StreamParams] = None):
+    params = params or StreamParams(fps=None, max_latency_ms=None, width=None, quality=None, gray=False)
+    # Alle viewers af samme kamera læser fra den samme capture-loop
+    sub = frame_hub.subscribe(camera, fps=params.fps, max_latency_ms=params.max_latency_ms,
+                              rendition=params.rendition)
+
     async def gen():
-        async for jpg in spot_client.mjpeg_frames(camera=camera):
+        # StreamingResponse henter først næste frame når den forrige er sendt,
+        # så en langsom klient automatisk springer til nyeste frame.
+        async for jpg in sub:
             yield (
                 f"--{BOUNDARY}\r\n"
                 "Content-Type: image/jpeg\r\n"
-                f"Content-Length: {len(jpg)}\r\n\r\n"
+                f"Content-Length: {len(jpg)}\r\n"
+                f"X-Dropped-Frames: {sub.dropped}\r\n\r\n"
             ).encode() + jpg + b"\r\n"
 
     headers = {"Cache-Control": "no-cache, no-store"}
@@ -24,22 +67,76 @@ def make_stream_response(camera: str):
         headers=headers,
     )
 
+@router.get("/stream/stats")
+async def stream_stats():
+    """Viewers, drops og publish-rate pr. kamera."""
+    return frame_hub.stats()
+
 @router.get("/stream/frontleft")
-async def stream_frontleft():
-    return make_stream_response("frontleft_fisheye_image")
+async def stream_frontleft(params: StreamParams = Depends()):
+    return make_stream_response("frontleft_fisheye_image", params)
 
 @router.get("/stream/frontright")
-async def stream_frontright():
-    return make_stream_response("frontright_fisheye_image")
+async def stream_frontright(params: StreamParams = Depends()):
+    return make_stream_response("frontright_fisheye_image", params)
 
 @router.get("/stream/left")
-async def stream_left():
-    return make_stream_response("left_fisheye_image")
+async def stream_left(params: StreamParams = Depends()):
+    return make_stream_response("left_fisheye_image", params)
 
 @router.get("/stream/right")
-async def stream_right():
-    return make_stream_response("right_fisheye_image")
+async def stream_right(params: StreamParams = Depends()):
+    return make_stream_response("right_fisheye_image", params)
 
 @router.get("/stream/back")
-async def stream_back():
-    return make_stream_response("back_fisheye_image")
+async def stream_back(params: StreamParams = Depends()):
+    return make_stream_response("back_fisheye_image", params)
+
+@router.get("/stream/mosaic")
+async def stream_mosaic(params: StreamParams = Depends()):
+    """Alle fem fisheye kameraer, drejet oprejst og tilet til én stream."""
+    return make_stream_response(MOSAIC, params)
+
+@router.get("/snapshot/{camera}")
+async def snapshot(
+    camera: str,
+    request: Request,
+    width: Optional[int] = Query(None, gt=0, description="Ønsket bredde i pixels"),
+    quality: Optional[int] = Query(None, ge=1, le=100, description="JPEG kvalitet"),
+    gray: bool = Query(False, description="Gråtoner"),
+):
+    """Nyeste still-billede fra et kamera (kort TTL cache, ETag/Last-Modified)."""
+    source = CAMERAS.get(camera)
+    if source is None:
+        return JSONResponse(content={"error": f"Ukendt kamera: {camera}"}, status_code=404)
+    rendition = Rendition.pick(width, quality, gray)
+    try:
+        seq, ts, frame = await frame_hub.snapshot(source)
+    except Exception as e:
+        return JSONResponse(content={"error": f"Snapshot fejlede: {e}"}, status_code=503)
+
+    etag = f'"{camera}-{frame_hub.epoch}-{seq}-{rendition}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(ts, usegmt=True),
+        "Cache-Control": "no-cache",   # klienten må cache, men skal revalidere
+    }
+    if _not_modified(request, etag, ts):
+        return Response(status_code=304, headers=headers)
+
+    jpg = await frame.encode(rendition)
+    return Response(content=jpg, media_type="image/jpeg", headers=headers)
+
+
+def _not_modified(request: Request, etag: str, ts: float) -> bool:
+    """Conditional GET: If-None-Match har forrang over If-Modified-Since."""
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        return etag in [tag.strip() for tag in inm.split(",")] or inm.strip() == "*"
+    ims = request.headers.get("if-modified-since")
+    if ims:
+        try:
+            return int(ts) <= parsedate_to_datetime(ims).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
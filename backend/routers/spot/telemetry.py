@@ -0,0 +1,24 @@
+# backend/routers/spot/telemetry.py
+from __future__ import annotations
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from ...services.spot_singleton import telemetry_hub
+from ...services.telemetry import sse
+
+router = APIRouter()
+
+
+@router.get("/telemetry")
+async def telemetry():
+    """Server-Sent Events: batteri, power, estop og lease – kun når noget ændrer sig.
+
+    Browseren bruger /events websocket'en; SSE optager en af de 6 HTTP/1.1
+    forbindelser pr. host, som kamera-streams allerede bruger.
+    """
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(sse(telemetry_hub.subscribe(), "telemetry"), media_type="text/event-stream", headers=headers)
+
+
+@router.get("/telemetry/stats")
+async def telemetry_stats():
+    return telemetry_hub.stats()
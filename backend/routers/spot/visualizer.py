@@ -0,0 +1,25 @@
+# backend/routers/spot/visualizer.py
+from __future__ import annotations
+from typing import Optional
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+
+from ...services.spot_singleton import visualizer_hub
+
+router = APIRouter()
+
+
+@router.websocket("/visualizer")
+async def visualizer_ws(ws: WebSocket, fps: Optional[float] = None):
+    """Binære Float32 frames (terrain punkter + fiducials + body pose), se services/visualizer_hub.py."""
+    await ws.accept()
+    try:
+        async for frame in visualizer_hub.subscribe(fps=fps):
+            await ws.send_bytes(frame)
+    except WebSocketDisconnect:
+        pass
+
+
+@router.get("/visualizer/stats")
+async def visualizer_stats():
+    return visualizer_hub.stats()
@@ -1,6 +1,6 @@
 # backend/services/base.py
 from __future__ import annotations
-from typing import AsyncIterator, Dict, Optional
+from typing import AsyncIterator, Dict, List, Optional
 
 class RobotClient:
     """Fælles interface for alle robottyper (Spot, MiR, UR, osv.)."""
@@ -11,5 +11,10 @@ class RobotClient:
     async def mjpeg_frames(self) -> AsyncIterator[bytes]:
         raise NotImplementedError
 
-    async def perception_stream(self) -> AsyncIterator[Dict]:
+    async def grab_frames(self, cameras: List[str]) -> Dict[str, "Frame"]:
+        """Ét billede (services.frames.Frame) pr. kamera, hentet samlet (batched)."""
+        raise NotImplementedError
+
+    async def perception_stream(self, camera: str = "frontleft_fisheye_image") -> AsyncIterator[Dict]:
+        """{"ts", "image_size", "boxes": [{"id", "label", "score", "xywh"}]} i `camera`s billedplan."""
         raise NotImplementedError
@@ -0,0 +1,258 @@
+# backend/services/command_jobs.py
+from __future__ import annotations
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Deque, Dict, List, Optional, Set
+import asyncio, functools, inspect, itertools, json, time
+
+# Hvor mange færdige jobs vi husker til GET /jobs/{id}
+JOB_HISTORY = 100
+# Et job der har ventet længere end dette i køen (sek.) startes ikke
+STALE_AFTER = 30.0
+# Max ventende events pr. lytter; ved overløb droppes de ældste
+LISTENER_QUEUE = 64
+KEEPALIVE_INTERVAL = 15.0
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobInterrupted(Exception):
+    """Et kørende coroutine-job blev afbrudt (af en stop-kommando eller DELETE /jobs/{id})."""
+
+
+class Job:
+    """Én robot-kommando i køen: status, besked og tidsstempler."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, action: str, fn: Callable, args: tuple, kwargs: dict, preempt: bool = False):
+        self.id = f"{int(time.time())}-{next(self._ids)}"
+        self.action = action
+        self.preempt = preempt
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.status = QUEUED
+        self.message: Optional[str] = None
+        self.progress: Optional[str] = None
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINISHED
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "action": self.action,
+            "preempt": self.preempt,
+            "status": self.status,
+            "message": self.message,
+            "progress": self.progress,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class CommandScheduler:
+    """Kø af robot-kommandoer med job-id'er.
+
+    POST /demo/* lægger et job i køen og svarer med det samme. Én worker-task
+    pr. robot kører jobs ét ad gangen (single writer), blokkerende SDK-kald i
+    en dedikeret tråd – ikke i AnyIO's fælles threadpool som Starlette bruger
+    til sync routes og filer. Coroutine-funktioner kører i deres egen task,
+    så de kan afbrydes undervejs.
+
+    Almindelige jobs køres i rækkefølge, og jobs der har ventet længere end
+    `stale_after` springes over. Stop-kommandoer (`preempt=True`, fx power
+    off) afbryder det kørende coroutine-job, annullerer de almindelige jobs i
+    kø og springer forrest i køen; de bliver aldrig forældede. Et kørende
+    blokkerende SDK-kald kan ikke afbrydes – stop-jobbet venter på at det
+    bliver færdigt (SDK'ets egne timeouts). Statusændringer pushes til
+    lyttere (/events websocket'en og /jobs/events SSE).
+    """
+
+    def __init__(self, client, stale_after: float = STALE_AFTER):
+        self._client = client
+        self.stale_after = stale_after
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="spot-cmd")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._pending: Deque[Job] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: Set[asyncio.Queue] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.current: Optional[Job] = None
+        self._current_task: Optional[asyncio.Task] = None
+
+    # ---------- jobs ----------
+    def submit(self, action: str, fn: Callable, *args, preempt: bool = False, **kwargs) -> Job:
+        """Læg `fn(*args, **kwargs)` i køen og returnér jobbet (kaldes fra event loopet).
+
+        Med `preempt=True` er det en stop-kommando: den afbryder det kørende
+        coroutine-job og de almindelige jobs i kø og køres som det næste.
+        """
+        self._loop = asyncio.get_running_loop()
+        job = Job(action, fn, args, kwargs, preempt=preempt)
+        self._remember(job)
+        if preempt:
+            reason = f"Afbrudt af {action} ({job.id})"
+            for old in [j for j in self._pending if not j.preempt]:
+                self._pending.remove(old)
+                self._cancel(old, reason)
+            # Efter tidligere stop-kommandoer, så de køres i den rækkefølge de kom
+            self._pending.append(job)
+            if self.current is not None and not self.current.preempt:
+                self._interrupt(self.current, reason)
+        else:
+            self._pending.append(job)
+        self._emit(job)
+        self._ensure_running()
+        self._wakeup.set()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> List[Job]:
+        return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Annullér et job i kø eller afbryd et kørende coroutine-job.
+
+        Et kørende blokkerende SDK-kald kan ikke afbrydes; jobbet returneres uændret.
+        """
+        job = self._jobs.get(job_id)
+        if job is not None and job.status == QUEUED:
+            self._pending.remove(job)
+            self._cancel(job, "Annulleret")
+        elif job is not None and job is self.current:
+            self._interrupt(job, "Annulleret")
+        return job
+
+    def report(self, job: Job, progress: str):
+        """Opdatér et jobs fremskridt – kan kaldes fra kommando-tråden."""
+        def _set():
+            job.progress = progress
+            self._emit(job)
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(_set)
+
+    def _cancel(self, job: Job, reason: str):
+        job.status, job.message, job.finished = CANCELLED, reason, time.time()
+        self._emit(job)
+
+    def _interrupt(self, job: Job, reason: str):
+        """Afbryd det kørende job hvis det er en coroutine (dens task annulleres)."""
+        task = self._current_task
+        if task is not None and not task.done():
+            job.message = reason
+            task.cancel()
+
+    def _remember(self, job: Job):
+        self._jobs[job.id] = job
+        while len(self._jobs) > JOB_HISTORY:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if not oldest.done:
+                break
+            del self._jobs[oldest_id]
+
+    # ---------- worker ----------
+    def _ensure_running(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            job = self._pending.popleft()
+            if not job.preempt and time.time() - job.created > self.stale_after:
+                self._cancel(job, f"Forældet – ventede over {self.stale_after:.0f} s i kø")
+                continue
+            await self._execute(job)
+
+    async def _execute(self, job: Job):
+        self.current = job
+        job.status, job.started = RUNNING, time.time()
+        self._emit(job)
+        try:
+            if asyncio.iscoroutinefunction(job.fn):
+                kwargs = dict(job.kwargs)
+                # Async kommandoer kan melde fremskridt undervejs (fx "Løfter…")
+                if "progress" in inspect.signature(job.fn).parameters:
+                    kwargs.setdefault("progress", functools.partial(self.report, job))
+                result = await self._run_task(job.fn(*job.args, **kwargs))
+            else:
+                call = functools.partial(job.fn, *job.args, **job.kwargs)
+                result = await asyncio.get_running_loop().run_in_executor(self._executor, call)
+            job.status, job.message = SUCCEEDED, result
+        except JobInterrupted:
+            job.status = CANCELLED
+        except asyncio.CancelledError:
+            job.status, job.message = CANCELLED, "Afbrudt"
+            raise
+        except Exception as e:
+            print(f"[CommandScheduler] {job.action} fejlede:", e)
+            job.status, job.error = FAILED, str(e)
+        finally:
+            job.finished = time.time()
+            self.current = None
+            self._emit(job)
+
+    async def _run_task(self, coro):
+        """Kør et coroutine-job i sin egen task, så `_interrupt` kan annullere
+        jobbet uden at ramme worker-tasken."""
+        task = self._current_task = asyncio.create_task(coro)
+        try:
+            await asyncio.wait({task})
+        except asyncio.CancelledError:
+            task.cancel()       # worker'en selv stoppes – tag jobbet med
+            raise
+        finally:
+            self._current_task = None
+        if task.cancelled():
+            raise JobInterrupted()
+        return task.result()
+
+    # ---------- push ----------
+    def _emit(self, job: Job):
+        msg = json.dumps(dict(job.to_dict(), type="job"), separators=(",", ":"))
+        for q in self._listeners:
+            if q.full():
+                q.get_nowait()      # drop den ældste – en langsom fane må ikke blokere
+            q.put_nowait(msg)
+
+    async def events(self, keepalive: Optional[float] = KEEPALIVE_INTERVAL) -> AsyncIterator[Optional[str]]:
+        """JSON beskeder med hver statusændring på alle jobs (None = keepalive)."""
+        q: asyncio.Queue = asyncio.Queue(maxsize=LISTENER_QUEUE)
+        self._listeners.add(q)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(q.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self._listeners.discard(q)
+
+    def stats(self) -> Dict:
+        return {
+            "current": self.current.id if self.current else None,
+            "queued": [job.id for job in self._pending],
+            "listeners": len(self._listeners),
+            "history": len(self._jobs),
+        }
+
+
+__all__ = ["Job", "CommandScheduler", "QUEUED", "RUNNING", "SUCCEEDED", "FAILED", "CANCELLED"]
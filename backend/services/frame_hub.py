@@ -0,0 +1,294 @@
+# backend/services/frame_hub.py
+from __future__ import annotations
+from collections import deque
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Any
+import asyncio, itertools, time
+
+from .frames import Frame, Rendition, NATIVE
+from .mosaic import MosaicBuilder, MOSAIC_SOURCES
+from .spot_async import run_blocking
+
+# Virtuelt "kamera": de fem fisheye kameraer tilet til ét oprejst billede
+MOSAIC = "mosaic"
+
+# Hvor gammel en frame må være før /snapshot henter en ny fra robotten (sek.)
+SNAPSHOT_TTL = 0.5
+
+
+class LatestSlot:
+    """Holder kun den nyeste værdi. Subscribers venter på et nyere sekvensnummer,
+    så en langsom læser springer gamle værdier over i stedet for at kø'e dem."""
+
+    def __init__(self):
+        self.seq = 0
+        self.value: Any = None
+        self.ts = 0.0
+        self._event = asyncio.Event()
+
+    def publish(self, value: Any) -> int:
+        self.seq += 1
+        self.value = value
+        self.ts = time.time()
+        # Væk alle ventende og start en ny "generation"
+        event, self._event = self._event, asyncio.Event()
+        event.set()
+        return self.seq
+
+    async def wait_newer(self, seq: int) -> Tuple[int, Any]:
+        """Returner (seq, value) så snart der findes noget nyere end `seq`."""
+        while self.seq <= seq:
+            await self._event.wait()
+        return self.seq, self.value
+
+
+class Subscription:
+    """Én HTTP viewer af et kamera.
+
+    Backpressure: vi henter først en ny frame når klienten har drænet den
+    forrige, og tager altid den nyeste – gamle frames kø'es aldrig. Valgfrit
+    `fps` loft og `max_latency_ms` (frames ældre end det sendes ikke).
+    `rendition` vælger opløsning/kvalitet; den encodes én gang pr. frame og
+    deles med alle andre viewers der har valgt samme rendition.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, hub: "FrameHub", camera: str, fps: Optional[float] = None,
+                 max_latency_ms: Optional[float] = None, rendition: Rendition = NATIVE):
+        self.id = next(self._ids)
+        self._hub = hub
+        self.camera = camera
+        self.fps = fps
+        self.max_latency_ms = max_latency_ms
+        self.rendition = rendition
+        self.sent = 0
+        self.dropped = 0
+        self._started = time.monotonic()
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        ch = self._hub._attach(self)
+        min_interval = 1.0 / self.fps if self.fps else 0.0
+        last = ch.slot.seq
+        next_send = 0.0
+        try:
+            while True:
+                # fps-loft: vent til næste tilladte tidspunkt; imens springes frames over
+                delay = next_send - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                seq, frame = await ch.slot.wait_newer(last)
+                skipped = seq - last - 1 if last else 0
+                last = seq
+                if self.max_latency_ms is not None and (time.time() - ch.slot.ts) * 1000.0 > self.max_latency_ms:
+                    # For gammel – drop den og vent på en nyere
+                    skipped += 1
+                    self._drop(ch, skipped)
+                    continue
+                self._drop(ch, skipped)
+                jpg = await frame.encode(self.rendition)
+                self.sent += 1
+                next_send = time.monotonic() + min_interval
+                yield jpg
+        finally:
+            self._hub._detach(self)
+
+    def _drop(self, ch: "CameraChannel", n: int):
+        if n > 0:
+            self.dropped += n
+            ch.dropped += n
+
+    def stats(self) -> Dict:
+        elapsed = time.monotonic() - self._started
+        return {
+            "id": self.id,
+            "fps_limit": self.fps,
+            "max_latency_ms": self.max_latency_ms,
+            "rendition": str(self.rendition),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "fps": round(self.sent / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+
+
+class CameraChannel:
+    """Latest-frame slot for ét kamera som alle viewers læser fra."""
+
+    def __init__(self, camera: str):
+        self.camera = camera
+        self.slot = LatestSlot()
+        self.connections: Dict[int, Subscription] = {}
+        self.dropped = 0        # frames som viewers sprang over (var for langsomme)
+        self.errors = 0
+        self.snapshot_hits = 0      # snapshots serveret fra cachen
+        self.snapshot_fetches = 0   # snapshots der krævede et RPC
+        self.snapshot_lock = asyncio.Lock()
+        self._publish_times: deque = deque(maxlen=30)
+
+    @property
+    def viewers(self) -> int:
+        return len(self.connections)
+
+    def publish(self, frame: Frame) -> int:
+        self._publish_times.append(time.monotonic())
+        return self.slot.publish(frame)
+
+    @property
+    def publish_fps(self) -> float:
+        if len(self._publish_times) < 2:
+            return 0.0
+        span = self._publish_times[-1] - self._publish_times[0]
+        return (len(self._publish_times) - 1) / span if span > 0 else 0.0
+
+    def stats(self) -> Dict:
+        return {
+            "viewers": self.viewers,
+            "published": self.slot.seq,
+            "publish_fps": round(self.publish_fps, 2),
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "snapshot_hits": self.snapshot_hits,
+            "snapshot_fetches": self.snapshot_fetches,
+            "connections": [sub.stats() for sub in self.connections.values()],
+        }
+
+
+class FrameHub:
+    """Deler kamera-frames mellem alle HTTP viewers.
+
+    Én scheduler-task samler de aktive kameraer til ét batched image-request
+    pr. tick og fordeler svarene ud på hvert kameras slot. Robotten ser derfor
+    højst ét image RPC pr. tick uanset antal kameraer og viewers. Scheduleren
+    startes ved første viewer og stoppes når den sidste går.
+
+    Har `MOSAIC` viewers, hentes de fem fisheye kameraer med i samme batch,
+    og mosaikken bygges og publiceres én gang pr. tick til alle dens viewers.
+    """
+
+    def __init__(self, client, fps: float = 15.0):
+        self._client = client
+        self.fps = fps
+        self._channels: Dict[str, CameraChannel] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._mosaic = MosaicBuilder()
+        # Indgår i ETags så seq-numre fra før en genstart ikke kan matche
+        self.epoch = int(time.time())
+        self.ticks = 0
+        self.rpcs = 0
+        self.frames_fetched = 0
+        self.errors = 0
+
+    def _channel(self, camera: str) -> CameraChannel:
+        ch = self._channels.get(camera)
+        if ch is None:
+            ch = self._channels[camera] = CameraChannel(camera)
+        return ch
+
+    def active_cameras(self) -> List[str]:
+        return [name for name, ch in self._channels.items() if ch.viewers > 0]
+
+    def _sources(self, active: List[str]) -> List[str]:
+        """Kamera sources der skal med i næste batch (mosaikken udfoldes)."""
+        sources = [cam for cam in active if cam != MOSAIC]
+        if MOSAIC in active:
+            sources += [cam for cam in MOSAIC_SOURCES if cam not in sources]
+        return sources
+
+    async def _tick(self, active: List[str]):
+        cameras = self._sources(active)
+        self.rpcs += 1
+        frames = await self._client.grab_frames(cameras)
+        self.frames_fetched += len(frames)
+        for camera in active:
+            if camera == MOSAIC:
+                continue
+            ch = self._channels[camera]
+            frame = frames.get(camera)
+            if frame is None:
+                ch.errors += 1
+            else:
+                ch.publish(frame)
+        if MOSAIC in active:
+            ch = self._channels[MOSAIC]
+            # Decode + drej + tile kører i trådpuljen; encodes senere pr. rendition
+            mosaic = await run_blocking(self._mosaic.build, frames)
+            if mosaic is None:
+                ch.errors += 1
+            else:
+                ch.publish(mosaic)
+
+    async def _run(self):
+        period = 1.0 / self.fps
+        while True:
+            cameras = self.active_cameras()
+            if not cameras:
+                return
+            t0 = time.monotonic()
+            self.ticks += 1
+            try:
+                await self._tick(cameras)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                print(f"[FrameHub] capture fejl ({', '.join(cameras)}):", e)
+                await asyncio.sleep(1.0)
+            await asyncio.sleep(max(0.0, period - (time.monotonic() - t0)))
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def _attach(self, sub: Subscription) -> CameraChannel:
+        ch = self._channel(sub.camera)
+        ch.connections[sub.id] = sub
+        self._ensure_running()
+        return ch
+
+    def _detach(self, sub: Subscription):
+        self._channels[sub.camera].connections.pop(sub.id, None)
+        if not self.active_cameras() and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def subscribe(self, camera: str, fps: Optional[float] = None,
+                  max_latency_ms: Optional[float] = None,
+                  rendition: Rendition = NATIVE) -> Subscription:
+        """Ny viewer af `camera`; iterér over den for at få de nyeste JPEG frames."""
+        return Subscription(self, camera, fps=fps, max_latency_ms=max_latency_ms,
+                            rendition=rendition)
+
+    async def snapshot(self, camera: str, ttl: float = SNAPSHOT_TTL) -> Tuple[int, float, Frame]:
+        """Nyeste frame for `camera` som (seq, ts, frame).
+
+        Serveres fra latest-frame slottet hvis den er yngre end `ttl`; ellers
+        hentes én ny frame. Samtidige kald deler samme hentning, så robotten
+        højst ser ét image RPC pr. kamera pr. TTL uanset antal pollere.
+        """
+        ch = self._channel(camera)
+        if ch.slot.value is None or time.time() - ch.slot.ts >= ttl:
+            async with ch.snapshot_lock:
+                # Tjek igen – en anden poller kan have hentet imens vi ventede
+                if ch.slot.value is None or time.time() - ch.slot.ts >= ttl:
+                    ch.snapshot_fetches += 1
+                    await self._tick([camera])
+                    if ch.slot.value is None:
+                        raise RuntimeError(f"Intet billede fra {camera}")
+                    return ch.slot.seq, ch.slot.ts, ch.slot.value
+        ch.snapshot_hits += 1
+        return ch.slot.seq, ch.slot.ts, ch.slot.value
+
+    def stats(self) -> Dict:
+        return {
+            "scheduler": {
+                "running": self._task is not None and not self._task.done(),
+                "ticks": self.ticks,
+                "rpcs": self.rpcs,
+                "frames_fetched": self.frames_fetched,
+                "avg_batch": round(self.frames_fetched / self.rpcs, 2) if self.rpcs else 0.0,
+                "errors": self.errors,
+            },
+            "cameras": {name: ch.stats() for name, ch in self._channels.items()},
+        }
+
+
+__all__ = ["MOSAIC", "LatestSlot", "Subscription", "CameraChannel", "FrameHub"]
@@ -0,0 +1,101 @@
+# backend/services/frames.py
+from __future__ import annotations
+from typing import Dict, NamedTuple, Optional
+import asyncio, io, time
+from PIL import Image
+
+from .spot_async import run_blocking
+
+# Den lille "stige" af renditions vi tilbyder. Forespurgte værdier snappes
+# hertil, så mange klienter deler de samme få encodede varianter.
+WIDTH_LADDER = (320, 640)       # + fuld opløsning (None)
+QUALITY_LADDER = (50, 75, 90)
+DEFAULT_QUALITY = 75
+
+
+class Rendition(NamedTuple):
+    """Hvordan en frame encodes: bredde (None = fuld), JPEG kvalitet, gråtoner."""
+    width: Optional[int] = None
+    quality: Optional[int] = None   # None = som optaget (robotens egen JPEG)
+    gray: bool = False
+
+    @classmethod
+    def pick(cls, width: Optional[int] = None, quality: Optional[int] = None,
+             gray: bool = False) -> "Rendition":
+        """Snap ønskede parametre til nærmeste rendition på stigen."""
+        if width is not None:
+            # Mindste trin der er mindst så bredt som ønsket; ellers fuld opløsning
+            width = next((w for w in WIDTH_LADDER if w >= width), None)
+        if quality is not None:
+            quality = min(QUALITY_LADDER, key=lambda q: abs(q - quality))
+        elif width is not None or gray:
+            quality = DEFAULT_QUALITY
+        return cls(width, quality, bool(gray))
+
+    @property
+    def is_native(self) -> bool:
+        return self.width is None and self.quality is None and not self.gray
+
+    def __str__(self) -> str:
+        if self.is_native:
+            return "native"
+        return f"{self.width or 'full'}w-q{self.quality}{'-gray' if self.gray else ''}"
+
+
+NATIVE = Rendition()
+
+
+class Frame:
+    """Ét optaget kamerabillede.
+
+    Holder enten robotens JPEG bytes eller et rå (decodet) billede. Hver
+    rendition encodes højst én gang pr. frame og deles af alle der beder om
+    den; encoding kører i SDK-trådpuljen, ikke på event loopet.
+    """
+
+    def __init__(self, jpeg: Optional[bytes] = None, image: Optional[Image.Image] = None,
+                 ts: Optional[float] = None):
+        assert jpeg is not None or image is not None, "Frame kræver jpeg eller image"
+        self.ts = ts if ts is not None else time.time()
+        self._jpeg = jpeg
+        self._image = image
+        self._renditions: Dict[Rendition, asyncio.Future] = {}
+
+    def image(self) -> Image.Image:
+        """Decodet billede (decodes fra JPEG første gang der er brug for det)."""
+        if self._image is None:
+            img = Image.open(io.BytesIO(self._jpeg))
+            img.load()
+            self._image = img
+        return self._image
+
+    def encode_sync(self, rendition: Rendition = NATIVE) -> bytes:
+        """Encode uden cache (blokkerende) – bruges fra tråde."""
+        if self._jpeg is not None and rendition.is_native:
+            return self._jpeg
+        img = self.image()
+        if rendition.gray and img.mode != "L":
+            img = img.convert("L")
+        elif not rendition.gray and img.mode not in ("L", "RGB"):
+            img = img.convert("RGB")
+        if rendition.width is not None and img.width > rendition.width:
+            h = max(1, round(img.height * rendition.width / img.width))
+            img = img.resize((rendition.width, h), Image.BILINEAR)
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=rendition.quality or DEFAULT_QUALITY)
+        return buf.getvalue()
+
+    async def encode(self, rendition: Rendition = NATIVE) -> bytes:
+        """JPEG bytes for `rendition` – encodes kun én gang pr. frame."""
+        if self._jpeg is not None and rendition.is_native:
+            return self._jpeg
+        fut = self._renditions.get(rendition)
+        if fut is None:
+            fut = self._renditions[rendition] = asyncio.ensure_future(
+                run_blocking(self.encode_sync, rendition)
+            )
+        # shield: en viewer der forsvinder må ikke annullere de andres encode
+        return await asyncio.shield(fut)
+
+
+__all__ = ["Rendition", "NATIVE", "Frame", "WIDTH_LADDER", "QUALITY_LADDER"]
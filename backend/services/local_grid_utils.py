@@ -0,0 +1,213 @@
+# Copyright (c) 2023 Boston Dynamics, Inc.  All rights reserved.
+#
+# Downloading, reproducing, distributing or otherwise using the SDK Software
+# is subject to the terms and conditions of the Boston Dynamics Software
+# Development Kit License (20191101-BDSDK-SL).
+
+"""Numpy helpers for decoding local grids, shared by the VTK visualizer and the web visualizer.
+
+Kept free of VTK so the webapp can import them without a desktop rendering stack.
+
+Run this module directly to check the vectorized RLE expansion against the original loop
+implementation (``--check``) and to time both (``--benchmark``).
+"""
+
+import argparse
+import timeit
+
+import numpy as np
+
+from bosdyn.api import local_grid_pb2
+from bosdyn.client.frame_helpers import GROUND_PLANE_FRAME_NAME, VISION_FRAME_NAME, get_a_tform_b
+
+
+def expand_data_by_rle_count(local_grid_proto, data_type=np.int16):
+    """Expand local grid data to full bytes data using the RLE count."""
+    cells_pz = np.frombuffer(local_grid_proto.local_grid.data, dtype=data_type)
+    rle_counts = np.asarray(local_grid_proto.local_grid.rle_counts, dtype=np.intp)
+    # For each value of rle_counts, we expand the cell data at the matching index
+    # to have that many repeated, consecutive values (one vectorized pass).
+    return np.repeat(cells_pz[:len(rle_counts)], rle_counts)
+
+
+def get_terrain_grid(local_grid_proto):
+    """Generate a 3xN set of points representing the terrain local grid."""
+    cells_pz_full = unpack_grid(local_grid_proto).astype(np.float32)
+    # Populate the x,y values with a complete combination of all possible pairs for the dimensions in the grid extent.
+    ys, xs = np.mgrid[0:local_grid_proto.local_grid.extent.num_cells_x,
+                      0:local_grid_proto.local_grid.extent.num_cells_y]
+    # Numpy vstack makes it so that each column is (x,y,z) for a single terrain point. The height values (z) come from the
+    # terrain grid's data field.
+    pts = np.vstack(
+        [np.ravel(xs).astype(np.float32),
+         np.ravel(ys).astype(np.float32), cells_pz_full]).T
+    pts[:, [0, 1]] *= (local_grid_proto.local_grid.extent.cell_size,
+                       local_grid_proto.local_grid.extent.cell_size)
+    return pts
+
+
+def get_valid_pts(local_grid_proto):
+    """Generate a 1xN set of binary indicators whether terrain height grid data point is valid."""
+    cell_flags = unpack_grid(local_grid_proto)
+    return cell_flags
+
+
+def get_intensity_grid(local_grid_proto):
+    """Generate a 3xN set of color intensities for the local grid points."""
+    intensity = unpack_grid(local_grid_proto)
+    # Repeat the same intensity for the (x,y,z) coordinates of an individual cell of the local grid.
+    cell_count = local_grid_proto.local_grid.extent.num_cells_x * local_grid_proto.local_grid.extent.num_cells_y
+    cells_color = np.zeros([cell_count, 4], dtype=np.uint8)
+    cells_color[:, :3] = np.repeat(intensity, 3).reshape(-1, 3)
+    return cells_color
+
+
+def offset_grid_pixels(pts, vision_tform_local_grid, cell_size):
+    """Offset the local grid's pixels to be in the world frame instead of the local grid frame."""
+    x_base = vision_tform_local_grid.position.x + cell_size * 0.5
+    y_base = vision_tform_local_grid.position.y + cell_size * 0.5
+    pts[:, 0] += x_base
+    pts[:, 1] += y_base
+    return pts
+
+
+def unpack_grid(local_grid_proto):
+    """Unpack the local grid proto."""
+    # Determine the data type for the bytes data.
+    data_type = get_numpy_data_type(local_grid_proto.local_grid)
+    if data_type is None:
+        print('Cannot determine the dataformat for the local grid.')
+        return None
+    # Decode the local grid.
+    if local_grid_proto.local_grid.encoding == local_grid_pb2.LocalGrid.ENCODING_RAW:
+        full_grid = np.frombuffer(local_grid_proto.local_grid.data, dtype=data_type)
+    elif local_grid_proto.local_grid.encoding == local_grid_pb2.LocalGrid.ENCODING_RLE:
+        full_grid = expand_data_by_rle_count(local_grid_proto, data_type=data_type)
+    else:
+        # Return nothing if there is no encoding type set.
+        return None
+    # Apply the offset and scaling to the local grid.
+    if local_grid_proto.local_grid.cell_value_scale == 0:
+        return full_grid
+    full_grid_float = full_grid.astype(np.float64)
+    full_grid_float *= local_grid_proto.local_grid.cell_value_scale
+    full_grid_float += local_grid_proto.local_grid.cell_value_offset
+    return full_grid_float
+
+
+def get_numpy_data_type(local_grid_proto):
+    """Convert the cell format of the local grid proto to a numpy data type."""
+    if local_grid_proto.cell_format == local_grid_pb2.LocalGrid.CELL_FORMAT_UINT16:
+        return np.uint16
+    elif local_grid_proto.cell_format == local_grid_pb2.LocalGrid.CELL_FORMAT_INT16:
+        return np.int16
+    elif local_grid_proto.cell_format == local_grid_pb2.LocalGrid.CELL_FORMAT_UINT8:
+        return np.uint8
+    elif local_grid_proto.cell_format == local_grid_pb2.LocalGrid.CELL_FORMAT_INT8:
+        return np.int8
+    elif local_grid_proto.cell_format == local_grid_pb2.LocalGrid.CELL_FORMAT_FLOAT64:
+        return np.float64
+    elif local_grid_proto.cell_format == local_grid_pb2.LocalGrid.CELL_FORMAT_FLOAT32:
+        return np.float32
+    else:
+        return None
+
+
+def get_ground_height_in_vision_frame(robot_state):
+    """Get the z-height of the ground plane in vision frame from a robot state sample."""
+    vision_tform_ground_plane = get_a_tform_b(robot_state.kinematic_state.transforms_snapshot,
+                                              VISION_FRAME_NAME, GROUND_PLANE_FRAME_NAME)
+    return vision_tform_ground_plane.position.z
+
+
+# Cell formats covered by the RLE equivalence check, per numpy data type.
+_CELL_FORMATS = {
+    np.uint16: local_grid_pb2.LocalGrid.CELL_FORMAT_UINT16,
+    np.int16: local_grid_pb2.LocalGrid.CELL_FORMAT_INT16,
+    np.uint8: local_grid_pb2.LocalGrid.CELL_FORMAT_UINT8,
+    np.int8: local_grid_pb2.LocalGrid.CELL_FORMAT_INT8,
+    np.float64: local_grid_pb2.LocalGrid.CELL_FORMAT_FLOAT64,
+    np.float32: local_grid_pb2.LocalGrid.CELL_FORMAT_FLOAT32,
+}
+
+
+def _expand_data_by_rle_count_loop(local_grid_proto, data_type=np.int16):
+    """The original per-cell RLE expansion, kept as the reference for the check and benchmark."""
+    cells_pz = np.frombuffer(local_grid_proto.local_grid.data, dtype=data_type)
+    cells_pz_full = []
+    for i in range(0, len(local_grid_proto.local_grid.rle_counts)):
+        for j in range(0, local_grid_proto.local_grid.rle_counts[i]):
+            cells_pz_full.append(cells_pz[i])
+    return np.array(cells_pz_full)
+
+
+def _rle_grid_proto(values, counts, data_type):
+    """Build an RLE encoded LocalGridResponse from run values and run lengths."""
+    proto = local_grid_pb2.LocalGridResponse(local_grid_type_name='terrain')
+    proto.local_grid.encoding = local_grid_pb2.LocalGrid.ENCODING_RLE
+    proto.local_grid.cell_format = _CELL_FORMATS[data_type]
+    proto.local_grid.data = np.asarray(values, dtype=data_type).tobytes()
+    proto.local_grid.rle_counts.extend(int(count) for count in counts)
+    return proto
+
+
+def check_rle_expansion(seed=0):
+    """Compare expand_data_by_rle_count with the loop implementation for every cell format.
+
+    Covers empty counts, zero-length runs (at the start, middle and end) and random grids.
+    Raises AssertionError on the first mismatch."""
+    rng = np.random.default_rng(seed)
+    for data_type in _CELL_FORMATS:
+        info = np.iinfo(data_type) if np.issubdtype(data_type, np.integer) else np.finfo(data_type)
+        random_values = rng.uniform(max(info.min, -1e4), min(info.max, 1e4), 500)
+        cases = [
+            ([], []),
+            ([1], [0]),
+            ([1, 2, 3, 4], [0, 3, 0, 2]),
+            ([5, 6, 7], [2, 1, 0]),
+            ([info.min, info.max], [4, 4]),
+            (random_values, rng.integers(0, 20, 500)),
+        ]
+        for values, counts in cases:
+            proto = _rle_grid_proto(values, counts, data_type)
+            expected = _expand_data_by_rle_count_loop(proto, data_type=data_type)
+            actual = expand_data_by_rle_count(proto, data_type=data_type)
+            assert actual.dtype == data_type, (data_type, actual.dtype)
+            # The loop returns float64 for an empty grid; compare values, not dtypes.
+            assert np.array_equal(actual, expected.astype(data_type)), (data_type, counts)
+
+
+def benchmark_rle_expansion(num_runs=4096, max_run=8, number=10, seed=0):
+    """Time the loop and vectorized RLE expansion on a random int16 grid.
+
+    Returns (loop ms, vectorized ms) per expansion."""
+    rng = np.random.default_rng(seed)
+    proto = _rle_grid_proto(rng.integers(-1000, 1000, num_runs), rng.integers(0, max_run, num_runs),
+                            np.int16)
+    loop = timeit.timeit(lambda: _expand_data_by_rle_count_loop(proto), number=number)
+    vectorized = timeit.timeit(lambda: expand_data_by_rle_count(proto), number=number)
+    return 1000.0 * loop / number, 1000.0 * vectorized / number
+
+
+def main():
+    """Command-line interface for the RLE check and benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--check', action='store_true',
+                        help='Compare the vectorized RLE expansion with the loop version.')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Time the loop and vectorized RLE expansion.')
+    parser.add_argument('--num-runs', default=4096, type=int,
+                        help='Number of RLE runs in the benchmark grid.')
+    options = parser.parse_args()
+
+    if options.check or not options.benchmark:
+        check_rle_expansion()
+        print(f'RLE expansion matches the loop version for {len(_CELL_FORMATS)} cell formats.')
+    if options.benchmark:
+        loop_ms, vectorized_ms = benchmark_rle_expansion(num_runs=options.num_runs)
+        print(f'{options.num_runs} runs: loop {loop_ms:.2f} ms, vectorized {vectorized_ms:.3f} ms '
+              f'({loop_ms / vectorized_ms:.0f}x)')
+
+
+if __name__ == '__main__':
+    main()
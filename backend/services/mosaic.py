@@ -0,0 +1,102 @@
+# backend/services/mosaic.py
+from __future__ import annotations
+from typing import Dict, List, Optional, Sequence, Tuple
+import threading
+import numpy as np
+from PIL import Image
+
+from .frames import Frame
+
+# Rækkefølge på mosaikken: sidekameraer yderst, front-parret i midten
+# (frontright til venstre, ligesom i robot.html) og bag-kameraet nederst.
+MOSAIC_ROWS: Tuple[Tuple[str, ...], ...] = (
+    ("left_fisheye_image", "frontright_fisheye_image", "frontleft_fisheye_image", "right_fisheye_image"),
+    ("back_fisheye_image",),
+)
+MOSAIC_SOURCES: Tuple[str, ...] = tuple(cam for row in MOSAIC_ROWS for cam in row)
+
+# Antal 90° drejninger (np.rot90, mod uret) så billedet står oprejst. Tabellen
+# deles med spot_fiducial, som laver sine cv2.rotate koder ud fra den.
+ROTATIONS: Dict[str, int] = {
+    "frontleft_fisheye_image": -1,
+    "frontright_fisheye_image": -1,
+    "right_fisheye_image": 2,
+}
+
+
+class MosaicBuilder:
+    """Tiler de fem fisheye kameraer til ét oprejst billede.
+
+    Layout og lærred beregnes én gang pr. kombination af billedstørrelser og
+    genbruges. Decode sker én gang pr. frame (Frame.image() caches), drejning
+    er en numpy view og placeringen er én slice-kopi pr. kamera. Mangler et
+    kamera i et tick, bliver dets forrige billede stående.
+    """
+
+    def __init__(self, rows: Sequence[Sequence[str]] = MOSAIC_ROWS):
+        self.rows = [list(r) for r in rows]
+        self._layout_key = None
+        self._shapes: Dict[str, Tuple[int, ...]] = {}
+        self._slots: Dict[str, Tuple[int, int, int, int]] = {}
+        self._canvas: Optional[np.ndarray] = None
+        # Scheduler og /snapshot kan bygge samtidig fra hver sin tråd
+        self._lock = threading.Lock()
+
+    def _tile(self, camera: str, frame: Frame) -> np.ndarray:
+        arr = np.asarray(frame.image())
+        return np.rot90(arr, ROTATIONS.get(camera, 0))
+
+    def _layout(self, tiles: Dict[str, np.ndarray]):
+        """Beregn position (y, x, h, w) for hvert kamera og alloker lærredet.
+
+        Bygger på alle kameraer vi har set, så et kamera der mangler i et
+        enkelt tick beholder sin plads (og sit forrige billede).
+        """
+        for cam, tile in tiles.items():
+            self._shapes[cam] = tile.shape
+        shapes = self._shapes
+        channels = 3 if any(len(shp) == 3 for shp in shapes.values()) else 1
+        key = (channels,) + tuple(sorted(shapes.items()))
+        if key == self._layout_key:
+            return
+        slots: Dict[str, Tuple[int, int, int, int]] = {}
+        row_sizes: List[Tuple[int, int]] = []
+        for row in self.rows:
+            present = [cam for cam in row if cam in shapes]
+            row_h = max((shapes[cam][0] for cam in present), default=0)
+            row_w = sum(shapes[cam][1] for cam in present)
+            row_sizes.append((row_h, row_w))
+        canvas_w = max((w for _, w in row_sizes), default=0)
+        y = 0
+        for row, (row_h, row_w) in zip(self.rows, row_sizes):
+            x = (canvas_w - row_w) // 2     # centrér rækken
+            for cam in row:
+                if cam not in shapes:
+                    continue
+                h, w = shapes[cam][:2]
+                slots[cam] = (y + (row_h - h) // 2, x, h, w)
+                x += w
+            y += row_h
+        shape = (y, canvas_w, 3) if channels == 3 else (y, canvas_w)
+        self._canvas = np.zeros(shape, dtype=np.uint8)
+        self._slots = slots
+        self._layout_key = key
+
+    def build(self, frames: Dict[str, Frame]) -> Optional[Frame]:
+        """Byg en mosaik-Frame af de kameraer der er med i `frames` (blokkerende)."""
+        tiles = {cam: self._tile(cam, frames[cam]) for row in self.rows for cam in row if cam in frames}
+        if not tiles:
+            return None
+        with self._lock:
+            self._layout(tiles)
+            canvas = self._canvas
+            for cam, tile in tiles.items():
+                y, x, h, w = self._slots[cam]
+                if canvas.ndim == 3 and tile.ndim == 2:
+                    tile = tile[:, :, None]     # gråtone broadcastes til RGB
+                canvas[y:y + h, x:x + w] = tile
+            # Kopi: lærredet genbruges næste tick mens denne frame stadig encodes
+            return Frame(image=Image.fromarray(canvas.copy()))
+
+
+__all__ = ["MOSAIC_ROWS", "MOSAIC_SOURCES", "ROTATIONS", "MosaicBuilder"]
@@ -0,0 +1,118 @@
+# backend/services/perception_codec.py
+from __future__ import annotations
+from typing import Dict, Iterable, List, Optional, Tuple
+import json, struct
+
+# Binært perception-format (little-endian), version 1
+#
+#   header:  magic "SP" | version u8 | kind u8 | seq u32 | base_seq u32 | ts f64
+#            | image_w u16 | image_h u16 | n_boxes u16 | n_removed u16
+#   box:     id_len u8 + id utf8 | label_len u8 + label utf8 | score f32 | x y w h f32
+#   removed: id_len u8 + id utf8
+#
+# Et keyframe (kind 0) indeholder alle bokse. Et delta (kind 1) indeholder kun
+# nye/ændrede bokse og id'er på fjernede bokse i forhold til `base_seq`; en
+# klient der ikke har base_seq skal vente på næste keyframe.
+MAGIC = b"SP"
+VERSION = 1
+KIND_KEYFRAME = 0
+KIND_DELTA = 1
+
+_HEADER = struct.Struct("<2sBBIIdHHHH")
+_BOX = struct.Struct("<f4f")
+_LEN = struct.Struct("<B")
+
+# (label, score, (x, y, w, h)) – det vi sammenligner på for at finde ændringer
+BoxKey = Tuple[str, float, Tuple[float, ...]]
+
+
+def box_table(boxes: Iterable[Dict]) -> Dict[str, BoxKey]:
+    """Bokse fra en perception-besked indekseret på `id`."""
+    return {
+        str(b["id"]): (str(b.get("label", "")), float(b.get("score", 0.0)), tuple(float(v) for v in b["xywh"]))
+        for b in boxes
+    }
+
+
+def diff_boxes(prev: Dict[str, BoxKey], cur: Dict[str, BoxKey]) -> Tuple[Dict[str, BoxKey], List[str]]:
+    """(nye eller ændrede bokse, id'er der er forsvundet) fra `prev` til `cur`."""
+    changed = {bid: box for bid, box in cur.items() if prev.get(bid) != box}
+    removed = [bid for bid in prev if bid not in cur]
+    return changed, removed
+
+
+def _short_str(s: str) -> bytes:
+    raw = s.encode("utf-8")[:255]
+    return _LEN.pack(len(raw)) + raw
+
+
+def encode_binary(kind: int, seq: int, base_seq: int, ts: float, image_size,
+                  boxes: Dict[str, BoxKey], removed: Iterable[str] = ()) -> bytes:
+    removed = list(removed)
+    w, h = image_size or (0, 0)
+    parts = [_HEADER.pack(MAGIC, VERSION, kind, seq & 0xFFFFFFFF, base_seq & 0xFFFFFFFF, ts,
+                          int(w), int(h), len(boxes), len(removed))]
+    for bid, (label, score, xywh) in boxes.items():
+        parts.append(_short_str(bid))
+        parts.append(_short_str(label))
+        parts.append(_BOX.pack(score, *xywh))
+    for bid in removed:
+        parts.append(_short_str(bid))
+    return b"".join(parts)
+
+
+def encode_json(msg: Dict) -> str:
+    """JSON-fallback: samme form som perception_stream() leverer."""
+    return json.dumps(msg, separators=(",", ":"))
+
+
+def decode_binary(data: bytes) -> Dict:
+    """Dekod én binær besked (bruges til fejlsøgning og af Python-klienter)."""
+    magic, version, kind, seq, base_seq, ts, w, h, n_boxes, n_removed = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Ukendt perception-format: {magic!r} v{version}")
+    off = _HEADER.size
+
+    def read_str():
+        nonlocal off
+        (n,) = _LEN.unpack_from(data, off)
+        off += _LEN.size
+        s = data[off:off + n].decode("utf-8")
+        off += n
+        return s
+
+    boxes = []
+    for _ in range(n_boxes):
+        bid, label = read_str(), read_str()
+        score, x, y, bw, bh = _BOX.unpack_from(data, off)
+        off += _BOX.size
+        boxes.append({"id": bid, "label": label, "score": score, "xywh": [x, y, bw, bh]})
+    removed = [read_str() for _ in range(n_removed)]
+    return {
+        "kind": "keyframe" if kind == KIND_KEYFRAME else "delta",
+        "seq": seq,
+        "base_seq": base_seq,
+        "ts": ts,
+        "image_size": [w, h],
+        "boxes": boxes,
+        "removed": removed,
+    }
+
+
+def apply_delta(state: Optional[Dict[str, Dict]], msg: Dict) -> Dict[str, Dict]:
+    """Opdatér en klients boks-tabel (id -> boks) med en dekodet besked."""
+    if msg["kind"] == "keyframe" or state is None:
+        state = {}
+    else:
+        state = dict(state)
+    for bid in msg["removed"]:
+        state.pop(bid, None)
+    for box in msg["boxes"]:
+        state[box["id"]] = box
+    return state
+
+
+__all__ = [
+    "KIND_KEYFRAME", "KIND_DELTA", "box_table", "diff_boxes",
+    "encode_binary", "encode_json", "decode_binary", "apply_delta",
+]
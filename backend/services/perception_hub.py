@@ -0,0 +1,277 @@
+# backend/services/perception_hub.py
+from __future__ import annotations
+from collections import deque
+from typing import AsyncIterator, Dict, Optional, Union
+import asyncio, itertools, time
+
+from .perception_codec import (
+    KIND_DELTA, KIND_KEYFRAME, BoxKey, box_table, diff_boxes, encode_binary, encode_json,
+)
+
+FORMAT_JSON = "json"
+FORMAT_BINARY = "binary"
+FORMATS = (FORMAT_JSON, FORMAT_BINARY)
+
+# Send et keyframe mindst hver N'te besked selv uden huller (~10 s ved 15 Hz)
+KEYFRAME_INTERVAL = 150
+# Max antal ventende beskeder pr. subscriber; ved overløb droppes de ældste
+QUEUE_SIZE = 8
+# Producer genstartes efter fejl med eksponentiel backoff (sek.) så længe der er subscribers
+RESTART_DELAY = 0.5
+MAX_RESTART_DELAY = 10.0
+
+
+class _RateMeter:
+    """Bytes pr. sekund over et glidende vindue."""
+
+    def __init__(self, window: float = 5.0):
+        self.window = window
+        self.total = 0
+        self._samples: deque = deque()
+
+    def add(self, n: int):
+        now = time.monotonic()
+        self.total += n
+        self._samples.append((now, n))
+        while self._samples and now - self._samples[0][0] > self.window:
+            self._samples.popleft()
+
+    @property
+    def rate(self) -> float:
+        if not self._samples:
+            return 0.0
+        span = max(time.monotonic() - self._samples[0][0], 1e-3)
+        return sum(n for _, n in self._samples) / span
+
+
+class PerceptionUpdate:
+    """Én perception-besked og dens encodings.
+
+    Hver encoding (JSON, keyframe, delta mod forrige besked) laves højst én
+    gang og deles af alle subscribers der skal bruge den.
+    """
+
+    def __init__(self, hub: "PerceptionHub", seq: int, msg: Dict, prev_boxes: Optional[Dict[str, BoxKey]]):
+        self.seq = seq
+        self.msg = msg
+        self.ts = float(msg.get("ts") or time.time())
+        self.published_at = time.monotonic()   # lokal tid – til lag-målingen
+        self.boxes = box_table(msg.get("boxes", ()))
+        self._hub = hub
+        self._prev_boxes = prev_boxes
+        self._cache: Dict[str, Union[str, bytes]] = {}
+
+    def _encode(self, kind: str, fn):
+        data = self._cache.get(kind)
+        if data is None:
+            t0 = time.perf_counter()
+            data = self._cache[kind] = fn()
+            self._hub._record_encode(kind, time.perf_counter() - t0, len(data))
+        return data
+
+    def json(self) -> str:
+        return self._encode("json", lambda: encode_json(self.msg))
+
+    def keyframe(self) -> bytes:
+        return self._encode("keyframe", lambda: encode_binary(
+            KIND_KEYFRAME, self.seq, 0, self.ts, self.msg.get("image_size"), self.boxes))
+
+    def delta(self) -> bytes:
+        """Delta mod seq-1 (keyframe hvis der ikke er nogen forrige besked)."""
+        if self._prev_boxes is None:
+            return self.keyframe()
+
+        def build():
+            changed, removed = diff_boxes(self._prev_boxes, self.boxes)
+            return encode_binary(KIND_DELTA, self.seq, self.seq - 1, self.ts,
+                                 self.msg.get("image_size"), changed, removed)
+        return self._encode("delta", build)
+
+
+class PerceptionSubscriber:
+    """Én websocket-klients kø af perception-beskeder.
+
+    Køen er begrænset: er den fuld når produceren publicerer, droppes den
+    ældste besked. Produceren venter derfor aldrig på en langsom klient, og
+    klienten får et keyframe efter hullet.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, fmt: str, maxlen: int = QUEUE_SIZE):
+        self.id = next(self._ids)
+        self.fmt = fmt
+        self._queue: deque = deque(maxlen=maxlen)
+        self._event = asyncio.Event()
+        self.last_seq = 0       # seq på seneste besked sendt til klienten
+        self.delivered = 0
+        self.dropped = 0
+
+    def push(self, update: "PerceptionUpdate"):
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1   # deque(maxlen) smider den ældste ud
+        self._queue.append(update)
+        self._event.set()
+
+    async def get(self) -> "PerceptionUpdate":
+        while not self._queue:
+            self._event.clear()
+            await self._event.wait()
+        return self._queue.popleft()
+
+    def lag(self, head_seq: int) -> Dict:
+        """Hvor langt klienten er bagud: beskeder i alt og alder på ældste i køen."""
+        oldest = self._queue[0].published_at if self._queue else None
+        return {
+            "messages": max(0, head_seq - self.last_seq),
+            "queued": len(self._queue),
+            "oldest_age_ms": round(1000.0 * (time.monotonic() - oldest), 1) if oldest is not None else 0.0,
+        }
+
+    def stats(self, head_seq: int) -> Dict:
+        return {
+            "id": self.id,
+            "format": self.fmt,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "lag": self.lag(head_seq),
+        }
+
+
+class PerceptionHub:
+    """Deler perception-beskeder mellem alle websocket-klienter.
+
+    Én producer-task pr. robot kører `client.perception_stream()` og lægger
+    hver besked i hver subscribers begrænsede kø (drop-oldest), så detektion
+    og world-object opslag kun laves én gang uanset antal klienter, og en
+    langsom klient hverken bremser produceren eller de andre. Klienter vælger
+    format: JSON (som før) eller binært med keyframes + deltas på boks-`id`.
+    Har en klient fået forrige besked, sendes deltaet; ellers (ny klient,
+    droppede beskeder) et keyframe. Produceren startes ved første klient og
+    stoppes ved den sidste; fejler perception-strømmen, genstartes den med
+    backoff så længe der er klienter.
+    """
+
+    def __init__(self, client, keyframe_interval: int = KEYFRAME_INTERVAL, queue_size: int = QUEUE_SIZE):
+        self._client = client
+        self.keyframe_interval = keyframe_interval
+        self.queue_size = queue_size
+        self.seq = 0
+        self.latest: Optional[PerceptionUpdate] = None
+        self._task: Optional[asyncio.Task] = None
+        self._subs: Dict[int, PerceptionSubscriber] = {}
+        self.errors = 0
+        self._encode_stats: Dict[str, Dict[str, float]] = {}
+        self._sent = {fmt: _RateMeter() for fmt in FORMATS}
+        self.keyframes_sent = 0
+        self.deltas_sent = 0
+
+    def _record_encode(self, kind: str, seconds: float, size: int):
+        st = self._encode_stats.setdefault(kind, {"count": 0, "seconds": 0.0, "bytes": 0})
+        st["count"] += 1
+        st["seconds"] += seconds
+        st["bytes"] += size
+
+    @property
+    def subscribers(self) -> Dict[str, int]:
+        counts = {fmt: 0 for fmt in FORMATS}
+        for sub in self._subs.values():
+            counts[sub.fmt] += 1
+        return counts
+
+    def publish(self, msg: Dict) -> int:
+        prev = self.latest
+        self.seq += 1
+        update = PerceptionUpdate(self, self.seq, msg, prev.boxes if prev is not None else None)
+        self.latest = update
+        for sub in self._subs.values():
+            sub.push(update)
+        return self.seq
+
+    async def _run(self):
+        delay = RESTART_DELAY
+        while self._subs:
+            try:
+                async for msg in self._client.perception_stream():
+                    self.publish(msg)
+                    delay = RESTART_DELAY
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                print(f"[PerceptionHub] perception fejl: {e} – genstarter om {delay:.1f} s")
+            # Tilsluttede klienter venter stadig – start produceren igen
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RESTART_DELAY)
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def _release(self, sub: PerceptionSubscriber):
+        self._subs.pop(sub.id, None)
+        if not self._subs and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def subscribe(self, fmt: str = FORMAT_JSON) -> AsyncIterator[Union[str, bytes]]:
+        """Beskeder i formatet `fmt`: str for JSON, bytes for binært."""
+        if fmt not in FORMATS:
+            raise ValueError(f"Ukendt format: {fmt}")
+        sub = PerceptionSubscriber(fmt, self.queue_size)
+        self._subs[sub.id] = sub
+        if self.latest is not None:
+            sub.push(self.latest)   # nuværende state med det samme
+        self._ensure_running()
+        since_key = 0
+        try:
+            while True:
+                update = await sub.get()
+                last, seq = sub.last_seq, update.seq
+                if fmt == FORMAT_JSON:
+                    data = update.json()
+                elif last and seq == last + 1 and since_key < self.keyframe_interval:
+                    data = update.delta()
+                    since_key += 1
+                    self.deltas_sent += 1
+                else:
+                    data = update.keyframe()
+                    since_key = 0
+                    self.keyframes_sent += 1
+                sub.last_seq = seq
+                sub.delivered += 1
+                self._sent[fmt].add(len(data))
+                yield data
+        finally:
+            self._release(sub)
+
+    def stats(self) -> Dict:
+        encode = {
+            kind: {
+                "count": st["count"],
+                "avg_ms": round(1000.0 * st["seconds"] / st["count"], 3) if st["count"] else 0.0,
+                "avg_bytes": round(st["bytes"] / st["count"], 1) if st["count"] else 0.0,
+            }
+            for kind, st in self._encode_stats.items()
+        }
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "published": self.seq,
+            "errors": self.errors,
+            "subscribers": self.subscribers,
+            "queue_size": self.queue_size,
+            "max_lag": max((sub.lag(self.seq)["messages"] for sub in self._subs.values()), default=0),
+            "dropped": sum(sub.dropped for sub in self._subs.values()),
+            "connections": [sub.stats(self.seq) for sub in self._subs.values()],
+            "encode": encode,
+            "keyframes_sent": self.keyframes_sent,
+            "deltas_sent": self.deltas_sent,
+            "bytes_per_s": {fmt: round(m.rate, 1) for fmt, m in self._sent.items()},
+            "bytes_total": {fmt: m.total for fmt, m in self._sent.items()},
+        }
+
+
+__all__ = [
+    "PerceptionHub", "PerceptionSubscriber", "PerceptionUpdate",
+    "FORMAT_JSON", "FORMAT_BINARY", "FORMATS", "KEYFRAME_INTERVAL", "QUEUE_SIZE",
+]
@@ -0,0 +1,123 @@
+# backend/services/robot_state_poller.py
+from __future__ import annotations
+from typing import Dict, Optional
+import threading, time
+
+from bosdyn.api import robot_state_pb2
+
+# Standard sample-rate for robot state (Hz)
+DEFAULT_STATE_POLL_HZ = 5.0
+
+
+def parse_battery(state) -> Optional[Dict]:
+    """Batteri-felter fra et RobotState proto (None hvis robotten ikke melder batteri)."""
+    if not state.battery_states:
+        return None
+
+    battery = state.battery_states[0]  # Spot har kun ét batteri
+
+    # Safely unwrap optional fields
+    return {
+        "battery_percentage": battery.charge_percentage.value if battery.HasField("charge_percentage") else None,
+        "voltage": battery.voltage.value if battery.HasField("voltage") else None,
+        "current": battery.current.value if battery.HasField("current") else None,
+        "temperatures": list(battery.temperatures) if battery.temperatures else [],
+        "status": battery.status,  # enum int
+    }
+
+
+def parse_power(state) -> str:
+    return robot_state_pb2.PowerState.MotorPowerState.Name(state.power_state.motor_power_state)
+
+
+def parse_estop(state) -> Dict:
+    estopped = any(s.state == robot_state_pb2.EStopState.STATE_ESTOPPED for s in state.estop_states)
+    return {
+        "estopped": estopped,
+        "sources": {s.name: robot_state_pb2.EStopState.State.Name(s.state) for s in state.estop_states},
+    }
+
+
+class RobotStateSampler:
+    """Baggrundstråd der poller RobotStateClient med en fast rate.
+
+    Holder det seneste RobotState proto og et parset snapshot i hukommelsen,
+    så /battery, /status og fiducial-followeren kan læse det uden netværks-I/O.
+    Robot-loaden er dermed uafhængig af hvor mange faner der er åbne.
+    """
+
+    def __init__(self, state_client, rate_hz: float = DEFAULT_STATE_POLL_HZ):
+        self._client = state_client
+        self.rate_hz = rate_hz
+        self.latest = None              # seneste RobotState proto
+        self.latest_ts = 0.0            # time.time() for seneste sample
+        self._snapshot: Dict = {}
+        self.samples = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="robot-state-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        period = 1.0 / self.rate_hz
+        while not self._stop.is_set():
+            t0 = time.monotonic()
+            try:
+                self.sample()
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)
+                print("[RobotStateSampler] robot state fejl:", e)
+            self._stop.wait(max(0.0, period - (time.monotonic() - t0)))
+
+    def sample(self):
+        """Hent ét nyt RobotState (blokkerende) og opdatér snapshottet."""
+        state = self._client.get_robot_state()
+        snapshot = {
+            "battery": parse_battery(state),
+            "power": parse_power(state),
+            "estop": parse_estop(state),
+        }
+        # Nyt dict hver gang – læsere ser aldrig et halvt opdateret snapshot
+        self.latest, self.latest_ts, self._snapshot = state, time.time(), snapshot
+        self.samples += 1
+        return state
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.latest_ts if self.latest_ts else float("inf")
+
+    def is_fresh(self, max_age: Optional[float] = None) -> bool:
+        """Har vi et sample der er yngre end `max_age` (default: 3 poll-perioder)?"""
+        if max_age is None:
+            max_age = max(3.0 / self.rate_hz, 1.0)
+        return self.age < max_age
+
+    def snapshot(self) -> Dict:
+        """Parset state + om den er frisk (online) og hvor gammel den er."""
+        age = round(self.age, 3) if self.latest_ts else None
+        return dict(self._snapshot, online=self.is_fresh(), age_s=age)
+
+    def battery(self) -> Optional[Dict]:
+        return self._snapshot.get("battery")
+
+    def stats(self) -> Dict:
+        return {
+            "rate_hz": self.rate_hz,
+            "samples": self.samples,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
+
+
+__all__ = ["RobotStateSampler", "DEFAULT_STATE_POLL_HZ", "parse_battery", "parse_power", "parse_estop"]
@@ -0,0 +1,88 @@
+# backend/services/spot_async.py
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+import asyncio, time
+
+# Dedikeret (begrænset) trådpulje til blokkerende SDK-kald og billed-encoding,
+# så vi ikke låner AnyIO's default pool som Starlette også bruger.
+SDK_EXECUTOR_WORKERS = 4
+_sdk_executor = ThreadPoolExecutor(max_workers=SDK_EXECUTOR_WORKERS, thread_name_prefix="spot-sdk")
+
+
+async def await_sdk_future(future) -> Any:
+    """Vent på en bosdyn FutureWrapper (fx fra `get_image_from_sources_async`)
+    uden at blokere event loopet."""
+    loop = asyncio.get_running_loop()
+    aio_future = loop.create_future()
+
+    def _done(fut):
+        def _resolve():
+            if aio_future.done():
+                return
+            try:
+                aio_future.set_result(fut.result())
+            except Exception as e:
+                aio_future.set_exception(e)
+        # Callback kommer fra en gRPC tråd – hop tilbage på loopet
+        loop.call_soon_threadsafe(_resolve)
+
+    future.add_done_callback(_done)
+    try:
+        return await aio_future
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+
+
+async def run_blocking(fn: Callable, *args) -> Any:
+    """Kør et blokkerende kald i SDK-trådpuljen."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_sdk_executor, fn, *args)
+
+
+class LoopLagMonitor:
+    """Måler hvor meget event loopet halter: sover `interval` sek. og ser hvor
+    meget senere vi faktisk vågner."""
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.last_ms = 0.0
+        self.max_ms = 0.0
+        self.avg_ms = 0.0
+        self.samples = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            t0 = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, (time.perf_counter() - t0 - self.interval) * 1000.0)
+            self.samples += 1
+            self.last_ms = lag_ms
+            self.max_ms = max(self.max_ms, lag_ms)
+            # Eksponentielt glidende gennemsnit
+            self.avg_ms = lag_ms if self.samples == 1 else 0.9 * self.avg_ms + 0.1 * lag_ms
+
+    def stats(self) -> Dict:
+        return {
+            "last_ms": round(self.last_ms, 2),
+            "avg_ms": round(self.avg_ms, 2),
+            "max_ms": round(self.max_ms, 2),
+            "samples": self.samples,
+        }
+
+
+loop_lag = LoopLagMonitor()
+
+
+__all__ = ["await_sdk_future", "run_blocking", "LoopLagMonitor", "loop_lag"]
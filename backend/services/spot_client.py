@@ -1,52 +1,117 @@
 # backend/services/spot_client.py
 from __future__ import annotations
-from typing import AsyncIterator, Dict
+from typing import AsyncIterator, Dict, List, Optional
 import asyncio, io, time, threading
 import numpy as np
-from PIL import Image
+from PIL import Image, ImageDraw
 import bosdyn.client
 import bosdyn.client.util
 from bosdyn.client.robot_command import RobotCommandClient, blocking_stand, blocking_sit, RobotCommandBuilder
 from bosdyn.client.lease import LeaseClient, LeaseKeepAlive
 from bosdyn.client.image import ImageClient
-from bosdyn.api import image_pb2
+from bosdyn.api import image_pb2, local_grid_pb2, world_object_pb2
 from bosdyn.api import robot_command_pb2  # Bruger den til rollover
 from bosdyn.client.robot_command import RobotCommandBuilder # Rollover
 from . import spot_fiducial
+from .spot_async import await_sdk_future
+from . import spot_commands
+from .spot_commands import command_until, is_standing, is_sitting, battery_change_pose_done
+from .frames import Frame
+from .robot_state_poller import RobotStateSampler, DEFAULT_STATE_POLL_HZ
+from .world_perception import CameraModel, WorldObjectProjector, scene_key, PERCEPTION_OBJECT_TYPES
 import math
 from bosdyn.client.math_helpers import SE3Pose   # SE3Pose is here
 from bosdyn.geometry import EulerZXY  
 from bosdyn.client.robot_state import RobotStateClient
+from bosdyn.client.world_object import WorldObjectClient
+from bosdyn.client.power import PowerClient
+from bosdyn.client.local_grid import LocalGridClient
+from bosdyn.client.frame_helpers import BODY_FRAME_NAME, VISION_FRAME_NAME, get_a_tform_b
 
 import threading
 
 
-
+def _image_to_pil(image) -> Image.Image:
+    """Lav et PIL billede af et rå (ikke-JPEG) Spot billede."""
+    if image.pixel_format == image_pb2.Image.PIXEL_FORMAT_GREYSCALE_U8:
+        mode = "L"
+    elif image.pixel_format == image_pb2.Image.PIXEL_FORMAT_RGBA_U8:
+        mode = "RGBA"
+    else:
+        mode = "RGB"
+    return Image.frombytes(mode, (image.cols, image.rows), image.data)
 
 
 # ============================================================
 # FAKE CLIENT (bruges til test uden Spot)
 # ============================================================
+class FakeFrameCache:
+    """Pre-encodede JPEG frames til FakeSpotClient.
+
+    Hele sekvensen renderes og encodes én gang ved opstart, så fake-streamen
+    ikke koster CPU pr. frame/viewer (vigtigt når vi load-tester hubben).
+    pattern: "black" (sort billede) eller "bars" (bevægeligt testbillede).
+    overlay: skriv frame-nummer og tidsstempel (relativ tid i sekvensen) på.
+    """
+
+    def __init__(self, w: int = 960, h: int = 540, pattern: str = "black",
+                 n_frames: int = 1, fps: float = 15.0, overlay: bool = False,
+                 quality: int = 75):
+        self.fps = fps
+        self.frames: List[Frame] = [
+            Frame(jpeg=self._render(w, h, pattern, i, n_frames, overlay, quality))
+            for i in range(max(1, n_frames))
+        ]
+
+    def _render(self, w, h, pattern, i, n, overlay, quality) -> bytes:
+        if pattern == "bars":
+            # Farvebjælker der glider mod højre hen over sekvensen
+            colors = np.array([[255, 255, 255], [255, 255, 0], [0, 255, 255], [0, 255, 0],
+                               [255, 0, 255], [255, 0, 0], [0, 0, 255], [0, 0, 0]], dtype=np.uint8)
+            cols = (np.arange(w) * len(colors)) // w
+            row = colors[cols]
+            row = np.roll(row, (i * w) // max(1, n), axis=0)
+            arr = np.broadcast_to(row, (h, w, 3)).copy()
+        else:
+            arr = np.zeros((h, w, 3), dtype=np.uint8)
+        img = Image.fromarray(arr, mode="RGB")
+        if overlay:
+            draw = ImageDraw.Draw(img)
+            text = f"#{i + 1}/{n}  t=+{i / self.fps:.3f}s"
+            draw.rectangle([8, 8, 16 + 7 * len(text), 30], fill=(0, 0, 0))
+            draw.text((12, 12), text, fill=(255, 255, 255))
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=quality)
+        return buf.getvalue()
+
+    def frame_at(self, t: float) -> Frame:
+        """Frame der hører til tidspunktet `t` (sekvensen gentages i loop)."""
+        return self.frames[int(t * self.fps) % len(self.frames)]
+
+
 class FakeSpotClient:
     name = "spot-001"
     kind = "spot"
     display_name = "Spot (Demo)"
 
-    def __init__(self, placeholder_path: str = "", w: int = 960, h: int = 540):
+    def __init__(self, placeholder_path: str = "", w: int = 960, h: int = 540,
+                 pattern: str = "black", n_frames: int = 1, overlay: bool = False):
         self._w, self._h = w, h
         self._placeholder = placeholder_path
+        self._frames = FakeFrameCache(w, h, pattern=pattern, n_frames=n_frames, overlay=overlay)
 
-    async def mjpeg_frames(self) -> AsyncIterator[bytes]:
-        """Simulerer en MJPEG stream ved at sende sorte billeder."""
+    async def mjpeg_frames(self, camera: str = "frontleft_fisheye_image") -> AsyncIterator[bytes]:
+        """Simulerer en MJPEG stream med de pre-encodede frames (alle kameranavne accepteres)."""
         while True:
-            arr = np.zeros((self._h, self._w, 3), dtype=np.uint8)
-            img = Image.fromarray(arr, mode="RGB")
-            buf = io.BytesIO()
-            img.save(buf, format="JPEG", quality=75)
-            yield buf.getvalue()
+            yield await self._frames.frame_at(time.time()).encode()
             await asyncio.sleep(1/15)  # ~15 fps
 
-    async def perception_stream(self) -> AsyncIterator[Dict]:
+    async def grab_frames(self, cameras: List[str]) -> Dict[str, Frame]:
+        """Simulerer et batched image-request: samme cachede frame til hvert kamera."""
+        frame = self._frames.frame_at(time.time())
+        return {camera: frame for camera in cameras}
+
+    async def perception_stream(self, camera: str = "frontleft_fisheye_image") -> AsyncIterator[Dict]:
         """Simulerer perception data: en firkant der bevæger sig frem og tilbage."""
         t0 = time.time()
         while True:
@@ -60,6 +125,41 @@ class FakeSpotClient:
                 ],
             }
             await asyncio.sleep(0.06)  # ~15 Hz
+
+    # ---------- Visualizer ----------
+    async def local_grids(self, names: List[str]) -> List:
+        """Syntetisk terrain (bølger der bevæger sig) i samme proto-form som LocalGridClient."""
+        n, cell = 64, 0.05
+        t = time.time()
+        ys, xs = np.mgrid[0:n, 0:n] * cell
+        heights = 0.15 * np.sin(xs * 2.0 + t) * np.cos(ys * 2.0)
+        grids = []
+        for name in names:
+            resp = local_grid_pb2.LocalGridResponse(local_grid_type_name=name)
+            grid = resp.local_grid
+            grid.extent.cell_size = cell
+            grid.extent.num_cells_x = grid.extent.num_cells_y = n
+            grid.encoding = local_grid_pb2.LocalGrid.ENCODING_RAW
+            grid.frame_name_local_grid_data = "terrain_grid"
+            for child, parent, offset in (("vision", "", 0.0), ("terrain_grid", "vision", -n * cell / 2)):
+                edge = grid.transforms_snapshot.child_to_parent_edge_map[child]
+                edge.parent_frame_name = parent
+                edge.parent_tform_child.position.x = edge.parent_tform_child.position.y = offset
+                edge.parent_tform_child.rotation.w = 1.0
+            if name == "terrain":
+                grid.cell_format = local_grid_pb2.LocalGrid.CELL_FORMAT_FLOAT32
+                grid.data = heights.astype(np.float32).tobytes()
+            else:
+                grid.cell_format = local_grid_pb2.LocalGrid.CELL_FORMAT_UINT8
+                grid.data = np.ones(n * n, dtype=np.uint8).tobytes()
+            grids.append(resp)
+        return grids
+
+    async def world_objects(self) -> List:
+        return []
+
+    def body_pose(self):
+        return None
     
     def get_battery_state(self):
         """Returner dummy batteridata til test."""
@@ -71,6 +171,17 @@ class FakeSpotClient:
             "status": "STATUS_UNKNOWN",
         }
 
+    def state_snapshot(self) -> Dict:
+        """Dummy robot-state snapshot (samme form som RobotStateSampler.snapshot)."""
+        return {
+            "battery": self.get_battery_state(),
+            "power": "STATE_OFF",
+            "estop": {"estopped": False, "sources": {}},
+            "lease": "held",
+            "online": True,
+            "age_s": 0.0,
+        }
+
 # ============================================================
 # REAL CLIENT (kræver Spot SDK + en rigtig robot)
 # ============================================================
@@ -79,7 +190,8 @@ class RealSpotClient:
     kind = "spot"
     display_name = "Spot (Real)"
 
-    def __init__(self, hostname: str, username: str, password: str):
+    def __init__(self, hostname: str, username: str, password: str,
+                 state_poll_hz: float = DEFAULT_STATE_POLL_HZ):
         try:
             print(f"[RealSpotClient] Forbinder til Spot @ {hostname} som {username}")
 
@@ -96,6 +208,15 @@ class RealSpotClient:
             self.command_client = self.robot.ensure_client(RobotCommandClient.default_service_name)
             self.lease_client   = self.robot.ensure_client(LeaseClient.default_service_name)
             self.image_client   = self.robot.ensure_client(ImageClient.default_service_name)
+            self.state_client   = self.robot.ensure_client(RobotStateClient.default_service_name)
+            self.world_object_client = self.robot.ensure_client(WorldObjectClient.default_service_name)
+            self.power_client   = self.robot.ensure_client(PowerClient.default_service_name)
+            self.local_grid_client = self.robot.ensure_client(LocalGridClient.default_service_name)
+
+            # Én baggrundstråd sampler robot state; /battery, /status og
+            # fiducial follow læser snapshottet i stedet for at lave egne RPCs
+            self.state_sampler = RobotStateSampler(self.state_client, rate_hz=state_poll_hz)
+            self.state_sampler.start()
 
             # Lease: force-take hvis en anden session holder den
             self.lease_keepalive = LeaseKeepAlive(self.lease_client, must_acquire=True, return_at_exit=True)
@@ -109,23 +230,29 @@ class RealSpotClient:
             raise
 
     # ---------------- DEMOS ----------------
-    def hello_spot(self) -> str:
-        print("[RealSpotClient] Starter Hello Spot demo...")
-
-        self.robot.power_on(timeout_sec=20)
-        assert self.robot.is_powered_on(), "Spot kunne ikke starte"
+    async def _ensure_powered_on(self, progress: spot_commands.Progress = None):
+        """Tænd motorerne (async) medmindre state-sampleren allerede melder dem tændt."""
+        if self.state_sampler.is_fresh() and self.state_sampler.snapshot().get("power") == "STATE_ON":
+            return
+        if progress:
+            progress("Tænder motorer…")
+        await spot_commands.power_on(self.power_client, timeout=20)
         print("[RealSpotClient] Power ON OK")
 
-        blocking_stand(self.command_client, timeout_sec=10)
-        print("[RealSpotClient] Spot står op")
-
-        # Løft → vent → sænk
-        self.command_client.robot_command(RobotCommandBuilder.synchro_stand_command(body_height=0.1))
-        time.sleep(2)
-        self.command_client.robot_command(RobotCommandBuilder.synchro_stand_command(body_height=-0.1))
-        time.sleep(2)
-        self.command_client.robot_command(RobotCommandBuilder.synchro_stand_command(body_height=0.0))
-        print("[RealSpotClient] Tilbage til normal stand")
+    async def hello_spot(self, progress: spot_commands.Progress = None) -> str:
+        """Stå op → løft → sænk → normal. Hvert trin venter på robottens feedback."""
+        print("[RealSpotClient] Starter Hello Spot demo...")
+        await self._ensure_powered_on(progress)
+
+        # (beskrivelse, body_height) – hvert trin er færdigt når robotten melder "standing"
+        steps = [("Rejser sig", None), ("Løfter", 0.1), ("Sænker", -0.1), ("Tilbage til normal", 0.0)]
+        for label, height in steps:
+            if progress:
+                progress(f"{label}…")
+            cmd = (RobotCommandBuilder.synchro_stand_command() if height is None
+                   else RobotCommandBuilder.synchro_stand_command(body_height=height))
+            await command_until(self.command_client, cmd, is_standing, timeout=10)
+            print(f"[RealSpotClient] {label} OK")
 
         return "Hello Spot demo udført!"
     
@@ -146,28 +273,29 @@ class RealSpotClient:
         assert self.robot.is_powered_on(), "Kunne ikke tænde Spot"
         return "Spot er tændt."
 
-    def roll_over(self, direction: int = 1) -> str:
+    async def roll_over(self, direction: int = 1, progress: spot_commands.Progress = None) -> str:
         """Få Spot til at gå i 'battery change position' (rollover).
         direction: 1 = højre, 2 = venstre
         """
         print("[RealSpotClient] Rollover (battery change position)")
 
         # Sørg for at robotten er tændt
-        self.robot.power_on(timeout_sec=20)
-        assert self.robot.is_powered_on(), "Spot kunne ikke starte"
+        await self._ensure_powered_on(progress)
 
-        # Sørg for at den sidder ned først
-        sit_cmd = RobotCommandBuilder.synchro_sit_command()
-        self.command_client.robot_command(sit_cmd)
-        time.sleep(3)
+        # Sørg for at den sidder ned først – vent til robotten melder "sitting"
+        if progress:
+            progress("Sætter sig…")
+        await command_until(self.command_client, RobotCommandBuilder.synchro_sit_command(), is_sitting, timeout=10)
 
         # Byg battery change pose kommando
         cmd = robot_command_pb2.RobotCommand()
         cmd.full_body_command.battery_change_pose_request.direction_hint = direction
 
-        # Send kommando
-        self.command_client.robot_command(cmd)
+        # Send kommando og vent på at rollover er gennemført
+        if progress:
+            progress("Ruller over…")
         print(f"[RealSpotClient] Spot laver rollover (dir={direction})")
+        await command_until(self.command_client, cmd, battery_change_pose_done, timeout=20)
 
         return "Spot er nu i battery change position (rollover)."
 
@@ -189,8 +317,9 @@ class RealSpotClient:
         distance_margin: float = 0.5,
         limit_speed: bool = True,
         avoid_obstacles: bool = False,
+        tag_id: Optional[int] = None,
     ) -> str:
-        """Start en fiducial follow demo i en separat tråd."""
+        """Start en fiducial follow demo i en separat tråd (kun `tag_id` hvis angivet)."""
         if self._fiducial_follower is not None:
             return "Fiducial follow kører allerede."
 
@@ -201,8 +330,9 @@ class RealSpotClient:
         options.limit_speed = limit_speed
         options.avoid_obstacles = avoid_obstacles
         options.use_world_objects = True  # eller False hvis du vil bruge apriltag
+        options.tag_id = tag_id  # None = følg det første tag der ses
 
-        follower = spot_fiducial.FollowFiducial(self.robot, options)
+        follower = spot_fiducial.FollowFiducial(self.robot, options, state_sampler=self.state_sampler)
         self._fiducial_follower = follower
 
         def _run():
@@ -242,31 +372,34 @@ class RealSpotClient:
         return "Self-right command sent."
 
     def get_battery_state(self):
-        """Hent batteritilstand fra den rigtige Spot."""
-        state_client: RobotStateClient = self.robot.ensure_client(RobotStateClient.default_service_name)
-        state = state_client.get_robot_state()
+        """Batteritilstand fra det seneste robot-state sample (ingen RPC)."""
+        return self.state_sampler.battery()
 
-        if not state.battery_states:
-            return None
-
-        battery = state.battery_states[0]  # Spot har kun ét batteri
-
-        # Safely unwrap optional fields
-        battery_percentage = battery.charge_percentage.value if battery.HasField("charge_percentage") else None
-        voltage = battery.voltage.value if battery.HasField("voltage") else None
-        current = battery.current.value if battery.HasField("current") else None
-        temperatures = list(battery.temperatures) if battery.temperatures else []
-        status = battery.status  # enum int;    
-
-        return {
-            "battery_percentage": battery_percentage,
-            "voltage": voltage,
-            "current": current,
-            "temperatures": temperatures,
-            "status": status,
-        }
+    def state_snapshot(self) -> Dict:
+        """Seneste parsede robot state (batteri, power, estop, lease) + friskhed."""
+        lease = "held" if self.lease_keepalive.is_alive() else "lost"
+        return dict(self.state_sampler.snapshot(), lease=lease)
 
     # ---------------- CAMERA STREAM ----------------
+    async def grab_frames(self, cameras: List[str]) -> Dict[str, Frame]:
+        """
+        Henter ét billede fra hver kamera source i ét batched RPC.
+        Returnerer {source_name: Frame}; sources uden svar udelades.
+        Rå billeder encodes først når (og i den opløsning) nogen beder om dem.
+        """
+        # Async RPC: loopet er frit mens vi venter på robotten
+        responses = await await_sdk_future(
+            self.image_client.get_image_from_sources_async(list(cameras))
+        )
+        frames: Dict[str, Frame] = {}
+        for resp in responses:
+            image = resp.shot.image
+            if image.format == image_pb2.Image.FORMAT_JPEG:
+                frames[resp.source.name] = Frame(jpeg=image.data)
+            else:
+                frames[resp.source.name] = Frame(image=_image_to_pil(image))
+        return frames
+
     async def mjpeg_frames(self, camera: str = "frontleft_fisheye_image") -> AsyncIterator[bytes]:
         """
         Streamer rigtige kamera billeder fra Spot som MJPEG.
@@ -280,26 +413,67 @@ class RealSpotClient:
         """
         while True:
             try:
-                image_responses = self.image_client.get_image_from_sources([camera])
-                img = image_responses[0]
-
-                if img.shot.image.format == image_pb2.Image.FORMAT_JPEG:
-                    yield img.shot.image.data
-                else:
-                    pil_img = Image.frombytes(
-                        "RGB",
-                        (img.shot.image.cols, img.shot.image.rows),
-                        img.shot.image.data,
-                    )
-                    buf = io.BytesIO()
-                    pil_img.save(buf, format="JPEG")
-                    yield buf.getvalue()
+                frames = await self.grab_frames([camera])
+                if camera in frames:
+                    yield await frames[camera].encode()
             except Exception as e:
                 print(f"[RealSpotClient] MJPEG frame error ({camera}):", e)
 
             await asyncio.sleep(1/15)  # ~15 fps
 
+    # ---------------- VISUALIZER ----------------
+    async def local_grids(self, names: List[str]) -> List:
+        """Local grids (LocalGridResponse) for `names` i ét async RPC."""
+        return await await_sdk_future(self.local_grid_client.get_local_grids_async(list(names)))
+
+    async def world_objects(self) -> List:
+        """Fiducials (AprilTag world objects) robotten kender lige nu."""
+        resp = await await_sdk_future(self.world_object_client.list_world_objects_async(
+            object_type=[world_object_pb2.WORLD_OBJECT_APRILTAG]))
+        return list(resp.world_objects)
+
+    def body_pose(self):
+        """vision_tform_body fra det seneste robot-state sample (None hvis intet sample endnu)."""
+        state = self.state_sampler.latest
+        if state is None:
+            return None
+        return get_a_tform_b(state.kinematic_state.transforms_snapshot, VISION_FRAME_NAME, BODY_FRAME_NAME)
+
+    # ---------------- PERCEPTION ----------------
+    async def perception_stream(self, camera: str = "frontleft_fisheye_image") -> AsyncIterator[Dict]:
+        """
+        World objects (fiducials m.m.) projiceret ind i `camera`s billedplan,
+        i samme boxes-skema som FakeSpotClient.
+        Kamera-intrinsics hentes én gang; robottens pose tages fra state-sampleren.
+        Der sendes kun en besked når scenen eller robottens pose har ændret sig.
+        """
+        responses = await await_sdk_future(self.image_client.get_image_from_sources_async([camera]))
+        model = CameraModel(responses[0])
+        projector = WorldObjectProjector()
+        last_key = None
+        while True:
+            try:
+                resp = await await_sdk_future(
+                    self.world_object_client.list_world_objects_async(object_type=PERCEPTION_OBJECT_TYPES)
+                )
+                state = self.state_sampler.latest
+                if state is not None and model.camera_tform_body is not None:
+                    body_tform_vision = get_a_tform_b(state.kinematic_state.transforms_snapshot,
+                                                      BODY_FRAME_NAME, VISION_FRAME_NAME)
+                    pose = body_tform_vision.to_matrix().round(3).tobytes()
+                    key = (scene_key(resp.world_objects), pose)
+                    if key != last_key:
+                        last_key = key
+                        yield {
+                            "ts": time.time(),
+                            "image_size": list(model.size),
+                            "boxes": projector.boxes(resp.world_objects, model, body_tform_vision),
+                        }
+            except Exception as e:
+                print(f"[RealSpotClient] perception fejl ({camera}):", e)
+                await asyncio.sleep(1.0)
 
+            await asyncio.sleep(1/15)  # ~15 Hz
 
 
 # ============================================================
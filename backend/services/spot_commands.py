@@ -0,0 +1,90 @@
+# backend/services/spot_commands.py
+from __future__ import annotations
+from typing import Callable, Optional
+import asyncio, time
+
+from bosdyn.api import basic_command_pb2, power_pb2
+from bosdyn.client.robot_command import CommandFailedErrorWithFeedback, CommandTimedOutError
+
+from .spot_async import await_sdk_future
+
+# Hvor ofte vi spørger robotten om feedback mens en kommando kører (sek.)
+FEEDBACK_PERIOD = 0.1
+
+Progress = Optional[Callable[[str], None]]
+
+_PROCESSING = basic_command_pb2.RobotCommandFeedbackStatus.STATUS_PROCESSING
+
+
+# ---------- "er kommandoen færdig?" checks på RobotCommandFeedbackResponse ----------
+def is_standing(resp) -> bool:
+    status = resp.feedback.synchronized_feedback.mobility_command_feedback.stand_feedback.status
+    return status == basic_command_pb2.StandCommand.Feedback.STATUS_IS_STANDING
+
+
+def is_sitting(resp) -> bool:
+    status = resp.feedback.synchronized_feedback.mobility_command_feedback.sit_feedback.status
+    return status == basic_command_pb2.SitCommand.Feedback.STATUS_IS_SITTING
+
+
+def battery_change_pose_done(resp) -> bool:
+    status = resp.feedback.full_body_feedback.battery_change_pose_feedback.status
+    if status == basic_command_pb2.BatteryChangePoseCommand.Feedback.STATUS_FAILED:
+        raise CommandFailedErrorWithFeedback("Battery change pose fejlede", resp)
+    return status == basic_command_pb2.BatteryChangePoseCommand.Feedback.STATUS_COMPLETED
+
+
+def _check_processing(resp):
+    """Fejl hvis robotten har opgivet kommandoen (overridden, timed out, frozen, ...)."""
+    fb = resp.feedback
+    if fb.HasField("full_body_feedback"):
+        status = fb.full_body_feedback.status
+    else:
+        status = fb.synchronized_feedback.mobility_command_feedback.status
+    if status != _PROCESSING:
+        name = basic_command_pb2.RobotCommandFeedbackStatus.Status.Name(status)
+        raise CommandFailedErrorWithFeedback(f"Kommando kører ikke længere ({name})", resp)
+
+
+async def command_until(command_client, command, done: Callable, timeout: float,
+                        end_time_secs: Optional[float] = None, period: float = FEEDBACK_PERIOD):
+    """Send `command` og vent (async) til `done(feedback)` er sand.
+
+    Async-udgaven af bosdyn's blocking_command: ingen tråd står og sover, og
+    vi er færdige så snart robotten melder det. Rejser CommandTimedOutError
+    efter `timeout` sekunder.
+    """
+    deadline = time.monotonic() + timeout
+    command_id = await await_sdk_future(
+        command_client.robot_command_async(command, end_time_secs=end_time_secs)
+    )
+    while True:
+        resp = await await_sdk_future(command_client.robot_command_feedback_async(command_id))
+        if done(resp):
+            return resp
+        _check_processing(resp)
+        if time.monotonic() >= deadline:
+            raise CommandTimedOutError(f"Kommando {command_id} blev ikke færdig inden {timeout:.0f} s")
+        await asyncio.sleep(period)
+
+
+async def power_on(power_client, timeout: float = 20.0, period: float = 0.25):
+    """Tænd motorerne og vent (async) på at power-kommandoen lykkes."""
+    deadline = time.monotonic() + timeout
+    resp = await await_sdk_future(power_client.power_command_async(power_pb2.PowerCommandRequest.REQUEST_ON_MOTORS))
+    if resp.status == power_pb2.STATUS_SUCCESS:
+        return
+    while True:
+        status = await await_sdk_future(power_client.power_command_feedback_async(resp.power_command_id))
+        if status == power_pb2.STATUS_SUCCESS:
+            return
+        if status != power_pb2.STATUS_IN_PROGRESS:
+            raise RuntimeError(f"Power on fejlede ({power_pb2.PowerCommandStatus.Name(status)})")
+        if time.monotonic() >= deadline:
+            raise CommandTimedOutError(f"Spot blev ikke tændt inden {timeout:.0f} s")
+        await asyncio.sleep(period)
+
+
+__all__ = [
+    "command_until", "power_on", "is_standing", "is_sitting", "battery_change_pose_done", "Progress",
+]
@@ -7,20 +7,22 @@
 """ Detect and follow fiducial tags. """
 import logging
 import math
+import os
 import signal
 import sys
 import threading
 import time
+from concurrent.futures import ProcessPoolExecutor
 from sys import platform
 
 import cv2
 import numpy as np
-from PIL import Image
 
 import bosdyn.client
 import bosdyn.client.util
 from bosdyn import geometry
-from bosdyn.api import geometry_pb2, image_pb2, trajectory_pb2, world_object_pb2
+from bosdyn.api import (basic_command_pb2, geometry_pb2, image_pb2, trajectory_pb2,
+                        world_object_pb2)
 from bosdyn.api.geometry_pb2 import SE2Velocity, SE2VelocityLimit, Vec2
 from bosdyn.api.spot import robot_command_pb2 as spot_command_pb2
 from bosdyn.client import ResponseError, RpcError, create_standard_sdk
@@ -35,6 +37,8 @@ from bosdyn.client.robot_id import RobotIdClient, version_tuple
 from bosdyn.client.robot_state import RobotStateClient
 from bosdyn.client.world_object import WorldObjectClient
 
+from .mosaic import ROTATIONS
+
 #pylint: disable=no-member
 LOGGER = logging.getLogger()
 
@@ -42,11 +46,118 @@ LOGGER = logging.getLogger()
 # to a position instead of the center.
 BODY_LENGTH = 1.1
 
+# Rate [Hz] of the follow control loop: one detection, one robot state sample and at most one
+# command or command feedback RPC per tick.
+DEFAULT_LOOP_HZ = 5.0
+
+# A cached fiducial pose older than this [s] is dropped instead of followed.
+FIDUCIAL_MAX_AGE = 3.0
+
+_SE2_FEEDBACK = basic_command_pb2.SE2TrajectoryCommand.Feedback
+_MOBILITY_PROCESSING = basic_command_pb2.RobotCommandFeedbackStatus.STATUS_PROCESSING
+
+# Tracking mode: the region searched around the last detection is padded by this fraction of
+# the tag's size in pixels, on top of how far the robot's motion may have moved the tag.
+ROI_PADDING = 0.75
+# Tracking windows larger than this (pixels) are downscaled before detection.
+ROI_MAX_SIDE = 320
+
+
+# cv2.rotate code for each number of counterclockwise quarter turns (as in np.rot90).
+_ROTATE_CODES = {
+    -1: cv2.ROTATE_90_CLOCKWISE,
+    1: cv2.ROTATE_90_COUNTERCLOCKWISE,
+    2: cv2.ROTATE_180,
+}
+
+# Rotation that turns each camera's raw image upright (sources not listed are already upright),
+# derived from the per-camera table shared with the camera mosaic.
+IMAGE_ROTATIONS = {source: _ROTATE_CODES[turns] for source, turns in ROTATIONS.items()}
+
+# Per-process detector state. Each detector worker process (and the main process, if it detects
+# itself) builds one apriltag detector and one upright-image buffer per camera source, then
+# reuses them for every frame.
+_detector = None
+_upright_buffers = {}
+
+
+def init_detector():
+    """Build this process's apriltag detector (used as the detector pool initializer)."""
+    global _detector
+    if _detector is None:
+        from apriltag import apriltag  # pylint: disable=import-outside-toplevel
+        _detector = apriltag(family='tag36h11')
+    return _detector
+
+
+def upright_image(data, dim, source_name):
+    """Upright greyscale image for the raw bytes of one camera frame.
+
+    The raw bytes are wrapped with np.frombuffer (no copy) and rotated or copied straight into
+    a buffer that is reused for the source, so no full-frame arrays are allocated per frame."""
+    cols, rows = int(dim[0]), int(dim[1])
+    raw = np.frombuffer(data, dtype=np.uint8, count=cols * rows).reshape(rows, cols)
+    code = IMAGE_ROTATIONS.get(source_name)
+    quarter_turn = code in (cv2.ROTATE_90_CLOCKWISE, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    shape = (cols, rows) if quarter_turn else (rows, cols)
+    buf = _upright_buffers.get(source_name)
+    if buf is None or buf.shape != shape:
+        buf = _upright_buffers[source_name] = np.empty(shape, dtype=np.uint8)
+    if code is None:
+        np.copyto(buf, raw)
+    else:
+        cv2.rotate(raw, code, dst=buf)
+    return buf
+
+
+def detect_fiducials(data, dim, source_name, roi=None, max_roi_side=None, tag_id=None,
+                     with_image=False):
+    """Detect fiducials in one raw greyscale image; runs in a detector worker process.
+
+    With `tag_id`, detections of other tags are ignored. With `roi` = (x0, y0, x1, y1) in
+    upright image pixels, only that window is searched, downscaled first if its longest side
+    exceeds `max_roi_side`. Bounding boxes are always in full upright image pixels.
+    Returns the bounding boxes, their tag IDs and, with `with_image`, a copy of the upright
+    image with the detections drawn in (None otherwise), e.g. for DisplayImagesAsync."""
+    image_grey = upright_image(data, dim, source_name)
+    if roi is None:
+        detections = init_detector().detect(image_grey)
+        offset, scale = np.zeros(2), 1.0
+    else:
+        height, width = image_grey.shape
+        x0, y0 = max(0, int(roi[0])), max(0, int(roi[1]))
+        x1, y1 = min(width, int(math.ceil(roi[2]))), min(height, int(math.ceil(roi[3])))
+        if x1 - x0 < 8 or y1 - y0 < 8:
+            return [], [], image_grey.copy() if with_image else None
+        window = image_grey[y0:y1, x0:x1]
+        scale = 1.0
+        if max_roi_side and max(window.shape) > max_roi_side:
+            scale = max_roi_side / max(window.shape)
+            window = cv2.resize(window, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        else:
+            window = np.ascontiguousarray(window)
+        detections = init_detector().detect(window)
+        offset = np.array([x0, y0], dtype=np.float64)
+
+    bboxes, tag_ids = [], []
+    for i in range(len(detections)):
+        if tag_id is not None and detections[i]['id'] != tag_id:
+            continue
+        bboxes.append(np.asarray(detections[i]['lb-rb-rt-lt'], dtype=np.float64) / scale + offset)
+        tag_ids.append(detections[i]['id'])
+    if not with_image:
+        return bboxes, tag_ids, None
+    # Draw the bounding box detections in a copy, so the reused buffer is never shown.
+    image_grey = image_grey.copy()
+    for bbox in bboxes:
+        cv2.polylines(image_grey, [np.int32(bbox)], True, (0, 0, 0), 2)
+    return bboxes, tag_ids, image_grey
+
 
 class FollowFiducial(object):
     """ Detect and follow a fiducial with Spot."""
 
-    def __init__(self, robot, options):
+    def __init__(self, robot, options, state_sampler=None):
 
         # Robot instance variable.
         self._robot = robot
@@ -57,6 +168,10 @@ class FollowFiducial(object):
         self._robot_command_client = robot.ensure_client(RobotCommandClient.default_service_name)
         self._world_object_client = robot.ensure_client(WorldObjectClient.default_service_name)
 
+        # Optional shared RobotStateSampler. When given, robot state is read from its latest
+        # sample instead of issuing a get_robot_state RPC on every access.
+        self._state_sampler = state_sampler
+
         # Stopping Distance (x,y) offset from the tag and angle offset from desired angle.
         self._tag_offset = float(options.distance_margin) + BODY_LENGTH / 2.0  # meters
 
@@ -85,6 +200,25 @@ class FollowFiducial(object):
         # Indicator for if motor power is on.
         self._powered_on = False
 
+        # Control loop rate and the robot state sampled for the current tick.
+        self._loop_hz = getattr(options, 'loop_hz', None) or DEFAULT_LOOP_HZ
+        self._tick_state = None
+
+        # The tag to follow. Without a requested tag ID the follower locks on to the first tag
+        # it sees and never switches to another one.
+        self._tag_id = getattr(options, 'tag_id', None)
+        # Local time of the newest world object detection seen; only newer ones are requested.
+        self._last_fiducial_time = None
+        # Last known fiducial position in the vision frame and its local acquisition time.
+        self._cached_fiducial = None
+        self._max_fiducial_age = getattr(options, 'max_fiducial_age', None) or FIDUCIAL_MAX_AGE
+
+        # Last trajectory command: id, (goal xy, heading) and when it expires.
+        self._command_id = None
+        self._command_goal = None
+        self._command_end_time = 0.0
+        self._at_goal = False
+
         # Counter for the number of iterations completed.
         self._attempts = 0
 
@@ -108,8 +242,10 @@ class FollowFiducial(object):
         # Heading angle based on the camera source which detected the fiducial.
         self._angle_desired = None
 
-        # Dictionary mapping camera source to it's latest image taken.
+        # Dictionary mapping camera source to it's latest image taken. Only filled while
+        # display_images is on (DisplayImagesAsync is running).
         self._image = dict()
+        self._display_images = False
 
         # List of all possible camera sources.
         self._source_names = [
@@ -121,22 +257,61 @@ class FollowFiducial(object):
         # Dictionary mapping camera source to previously computed extrinsics.
         self._camera_to_extrinsics_guess = self.populate_source_dict()
 
-        # Camera source which a bounding box was last detected in.
-        self._previous_source = None
+        # Tracking mode: once a tag is found, search only a window around it in the same camera
+        # and fall back to scanning every camera on a miss.
+        self._track_roi = getattr(options, 'track_roi', True)
+        self._roi_max_side = getattr(options, 'roi_max_side', ROI_MAX_SIDE)
+        # Last detection: (source name, 4x2 bbox corners, tag depth [m], time), or None.
+        self._track = None
+
+        # One batched image request covering every camera source.
+        self._image_requests = [
+            build_image_request(src, quality_percent=100, image_format=image_pb2.Image.FORMAT_RAW)
+            for src in self._source_names
+        ]
+
+        # Process pool running the apriltag detection for all cameras in parallel. The apriltag
+        # library holds the GIL for most of a detection, so threads would serialize.
+        self._detector_pool = None
+        if not self._use_world_object_service:
+            processes = getattr(options, 'detector_processes', None) or min(
+                len(self._source_names), os.cpu_count() or 1)
+            self._detector_pool = ProcessPoolExecutor(max_workers=processes,
+                                                      initializer=init_detector)
 
         self._running = False
 
 
     @property
     def robot_state(self):
-        """Get latest robot state proto."""
+        """Get latest robot state proto (from the shared sampler when it has a fresh sample)."""
+        if self._state_sampler is not None and self._state_sampler.is_fresh():
+            return self._state_sampler.latest
         return self._robot_state_client.get_robot_state()
 
+    @property
+    def tick_state(self):
+        """Robot state for the current control loop tick, sampled at most once per tick."""
+        if self._tick_state is None:
+            self._tick_state = self.robot_state
+        return self._tick_state
+
     @property
     def image(self):
         """Return the current image associated with each source name."""
         return self._image
 
+    @property
+    def display_images(self):
+        """Whether annotated camera images are kept for display."""
+        return self._display_images
+
+    @display_images.setter
+    def display_images(self, enabled):
+        self._display_images = enabled
+        if not enabled:
+            self._image.clear()
+
     @property
     def image_sources_list(self):
         """Return the list of camera sources."""
@@ -169,24 +344,21 @@ class FollowFiducial(object):
             # Delay grabbing image until spot is standing (or close enough to upright).
             time.sleep(.35)
 
+        period = 1.0 / self._loop_hz
+        was_detected = True
         while self._running and self._attempts <= self._max_attempts:
+            tick_start = time.time()
+            self._tick_state = None
             detected_fiducial = False
             fiducial_rt_world = None
             if self._use_world_object_service:
-                # Get the first fiducial object Spot detects with the world object service.
-                fiducial = self.get_fiducial_objects()
-                if fiducial is not None:
-                    vision_tform_fiducial = get_a_tform_b(
-                        fiducial.transforms_snapshot, VISION_FRAME_NAME,
-                        fiducial.apriltag_properties.frame_name_fiducial).to_proto()
-                    if vision_tform_fiducial is not None:
-                        detected_fiducial = True
-                        fiducial_rt_world = vision_tform_fiducial.position
+                # Position of the followed fiducial from Spot's world object service.
+                fiducial_rt_world = self.get_fiducial_position()
+                detected_fiducial = fiducial_rt_world is not None
             else:
                 # Detect the april tag in the images from Spot using the apriltag library.
                 bboxes, source_name = self.image_to_bounding_box()
                 if bboxes:
-                    self._previous_source = source_name
                     (tvec, _, source_name) = self.pixel_coords_to_camera_coords(
                         bboxes, self._intrinsics, source_name)
                     vision_tform_fiducial_position = self.compute_fiducial_in_world_frame(tvec)
@@ -198,11 +370,16 @@ class FollowFiducial(object):
             if detected_fiducial:
                 # Go to the tag and stop within a certain distance
                 self.go_to_tag(fiducial_rt_world)
-            else:
+            elif was_detected:
                 print('No fiducials found')
+            was_detected = detected_fiducial
 
             self._attempts += 1  #increment attempts at finding a fiducial
 
+            # Hold the loop rate, also while no fiducial is in sight.
+            time.sleep(max(0.0, period - (time.time() - tick_start)))
+
+        self.shutdown_detectors()
         return
 
     def stop(self):
@@ -214,20 +391,55 @@ class FollowFiducial(object):
             print("Fiducial following stopped (movement halted).")
         except Exception as e:
             print(f"Fiducial stop: could not send stop command: {e}")
+        self.shutdown_detectors()
 
+    def shutdown_detectors(self):
+        """Stop the apriltag detector processes."""
+        if self._detector_pool is not None:
+            self._detector_pool.shutdown(wait=False, cancel_futures=True)
+            self._detector_pool = None
 
 
     def get_fiducial_objects(self):
-        """Get all fiducials that Spot detects with its perception system."""
-        # Get all fiducial objects (an object of a specific type).
+        """Get the followed fiducial if Spot's perception system has a newer detection of it.
+           Only objects acquired after the last one seen are requested, so an unchanged
+           detection is not transferred again."""
         request_fiducials = [world_object_pb2.WORLD_OBJECT_APRILTAG]
         fiducial_objects = self._world_object_client.list_world_objects(
-            object_type=request_fiducials).world_objects
-        if len(fiducial_objects) > 0:
-            # Return the first detected fiducial.
-            return fiducial_objects[0]
-        # Return none if no fiducials are found.
-        return None
+            object_type=request_fiducials, time_start_point=self._last_fiducial_time).world_objects
+        fiducial_objects = [
+            obj for obj in fiducial_objects
+            if self._tag_id is None or obj.apriltag_properties.tag_id == self._tag_id
+        ]
+        if not fiducial_objects:
+            # Return none if no new detections of the tag are found.
+            return None
+        fiducial = max(fiducial_objects,
+                       key=lambda obj: (obj.acquisition_time.seconds, obj.acquisition_time.nanos))
+        if self._tag_id is None:
+            self._tag_id = fiducial.apriltag_properties.tag_id
+            print(f'Following fiducial {self._tag_id}')
+        self._last_fiducial_time = self._robot.time_sync.get_robot_time_converter(
+        ).local_seconds_from_robot_timestamp(fiducial.acquisition_time)
+        return fiducial
+
+    def get_fiducial_position(self):
+        """Position of the followed fiducial in the vision frame: from a new detection, or the
+           cached one while it is younger than the maximum age."""
+        fiducial = self.get_fiducial_objects()
+        if fiducial is not None:
+            vision_tform_fiducial = get_a_tform_b(fiducial.transforms_snapshot, VISION_FRAME_NAME,
+                                                  fiducial.apriltag_properties.frame_name_fiducial)
+            if vision_tform_fiducial is not None:
+                self._cached_fiducial = (vision_tform_fiducial.to_proto().position,
+                                         self._last_fiducial_time)
+        if self._cached_fiducial is None:
+            return None
+        position, acquired = self._cached_fiducial
+        if time.time() - acquired > self._max_fiducial_age:
+            self._cached_fiducial = None
+            return None
+        return position
 
     def power_on(self):
         """Power on the robot."""
@@ -242,68 +454,136 @@ class FollowFiducial(object):
 
     def image_to_bounding_box(self):
         """Determine which camera source has a fiducial.
-           Return the bounding box of the first detected fiducial."""
-        #Iterate through all five camera sources to check for a fiducial
-        for i in range(len(self._source_names) + 1):
-            # Get the image from the source camera.
-            if i == 0:
-                if self._previous_source is not None:
-                    # Prioritize the camera the fiducial was last detected in.
-                    source_name = self._previous_source
-                else:
-                    continue
-            elif self._source_names[i - 1] == self._previous_source:
-                continue
-            else:
-                source_name = self._source_names[i - 1]
-
-            img_req = build_image_request(source_name, quality_percent=100,
-                                          image_format=image_pb2.Image.FORMAT_RAW)
-            image_response = self._image_client.get_image([img_req])
-            self._camera_tform_body = get_a_tform_b(image_response[0].shot.transforms_snapshot,
-                                                    image_response[0].shot.frame_name_image_sensor,
-                                                    BODY_FRAME_NAME)
-            self._body_tform_world = get_a_tform_b(image_response[0].shot.transforms_snapshot,
-                                                   BODY_FRAME_NAME, VISION_FRAME_NAME)
-
-            # Camera intrinsics for the given source camera.
-            self._intrinsics = image_response[0].source.pinhole.intrinsics
-            width = image_response[0].shot.image.cols
-            height = image_response[0].shot.image.rows
-
-            # detect given fiducial in image and return the bounding box of it
-            bboxes = self.detect_fiducial_in_image(image_response[0].shot.image, (width, height),
-                                                   source_name)
+           While tracking, only the window around the last detection is searched; otherwise
+           (or on a miss) every camera is scanned.
+           Return the bounding boxes and the source they were detected in."""
+        if self._track_roi and self._track is not None:
+            bboxes, source_name = self.track_in_roi()
             if bboxes:
-                print(f'Found bounding box for {source_name}')
                 return bboxes, source_name
-            else:
-                self._tag_not_located = True
-                print(f'Failed to find bounding box for {source_name}')
-        return [], None
+            print(f'Lost fiducial in {self._track[0]}, scanning all cameras')
+            self._track = None
+        return self.scan_all_sources()
+
+    def scan_all_sources(self):
+        """Fetch all sources in one request and search them in parallel, so a loop costs
+           roughly the slowest camera instead of the sum of all of them.
+           Return the bounding box of the fiducial closest to the robot and its source. Without
+           a requested tag ID, the follower locks on to that tag."""
+        if self._detector_pool is None:
+            return [], None
+        image_responses = self._image_client.get_image(self._image_requests)
+        detections = [
+            self._detector_pool.submit(detect_fiducials, response.shot.image.data,
+                                       (response.shot.image.cols, response.shot.image.rows),
+                                       response.source.name, tag_id=self._tag_id,
+                                       with_image=self._display_images)
+            for response in image_responses
+        ]
+
+        best = None  # (distance, bbox, tag id, image response, tvec)
+        for response, detection in zip(image_responses, detections):
+            source_name = response.source.name
+            bboxes, tag_ids, image_grey = detection.result()
+            if image_grey is not None:
+                self._image[source_name] = image_grey
+            for bbox, tag_id in zip(bboxes, tag_ids):
+                tvec, _, _ = self.pixel_coords_to_camera_coords([bbox],
+                                                                response.source.pinhole.intrinsics,
+                                                                source_name)
+                if tvec is None:
+                    continue
+                dist = float(np.linalg.norm(tvec)) / 1000.0
+                if best is None or dist < best[0]:
+                    best = (dist, bbox, tag_id, response, tvec)
+
+        if best is None:
+            self._tag_not_located = True
+            return [], None
+        _, bbox, tag_id, response, tvec = best
+        if self._tag_id is None:
+            self._tag_id = tag_id
+            print(f'Following fiducial {self._tag_id}')
+        print(f'Found bounding box for {response.source.name}')
+        self.use_image_response(response, [bbox], tvec)
+        return [bbox], response.source.name
+
+    def track_in_roi(self):
+        """Search for the tracked fiducial in a window around its last detection, using only the
+           camera it was last seen in."""
+        source_name = self._track[0]
+        request = self._image_requests[self._source_names.index(source_name)]
+        response = self._image_client.get_image([request])[0]
+        dim = (response.shot.image.cols, response.shot.image.rows)
+        roi = self.predict_roi(response.source.pinhole.intrinsics)
+        bboxes, _, image_grey = detect_fiducials(response.shot.image.data, dim, source_name,
+                                                 roi=roi, max_roi_side=self._roi_max_side,
+                                                 tag_id=self._tag_id,
+                                                 with_image=self._display_images)
+        if image_grey is not None:
+            self._image[source_name] = image_grey
+        if not bboxes:
+            return [], None
+        tvec, _, _ = self.pixel_coords_to_camera_coords(bboxes, response.source.pinhole.intrinsics,
+                                                        source_name)
+        if tvec is None:
+            return [], None
+        self.use_image_response(response, bboxes, tvec)
+        return bboxes, source_name
+
+    def predict_roi(self, intrinsics):
+        """Predict the (x0, y0, x1, y1) window the tracked tag is in now.
+
+        The last bounding box is grown by a padding relative to the tag's size plus the number
+        of pixels the robot's current velocity can have moved the tag since it was seen."""
+        _, bbox, depth, stamp = self._track
+        elapsed = time.time() - stamp
+        velocity = self.tick_state.kinematic_state.velocity_of_body_in_vision
+        speed = math.sqrt(velocity.linear.x**2 + velocity.linear.y**2 + velocity.linear.z**2)
+        turn_rate = math.sqrt(velocity.angular.x**2 + velocity.angular.y**2 + velocity.angular.z**2)
+        # Translation moves the tag by about f * d / depth pixels, rotation by about f * angle.
+        motion = intrinsics.focal_length.x * elapsed * (speed / max(depth, 0.1) + turn_rate)
+        (x0, y0), (x1, y1) = bbox.min(axis=0), bbox.max(axis=0)
+        pad = ROI_PADDING * max(x1 - x0, y1 - y0) + motion
+        return (x0 - pad, y0 - pad, x1 + pad, y1 + pad)
+
+    def use_image_response(self, response, bboxes, tvec):
+        """Use the camera a fiducial was detected in for the world frame computation and
+           remember the detection for tracking."""
+        self._camera_tform_body = get_a_tform_b(response.shot.transforms_snapshot,
+                                                response.shot.frame_name_image_sensor,
+                                                BODY_FRAME_NAME)
+        self._body_tform_world = get_a_tform_b(response.shot.transforms_snapshot, BODY_FRAME_NAME,
+                                               VISION_FRAME_NAME)
+
+        # Camera intrinsics for the given source camera.
+        self._intrinsics = response.source.pinhole.intrinsics
+        corners = np.concatenate([np.asarray(bbox, dtype=np.float64) for bbox in bboxes])
+        self._track = (response.source.name, corners, float(tvec[2][0]) / 1000.0, time.time())
 
     def detect_fiducial_in_image(self, image, dim, source_name):
         """Detect the fiducial within a single image and return its bounding box."""
-        image_grey = np.array(
-            Image.frombytes('P', (int(dim[0]), int(dim[1])), data=image.data, decoder_name='raw'))
-
-        #Rotate each image such that it is upright
-        image_grey = self.rotate_image(image_grey, source_name)
-
-        #Make the image greyscale to use bounding box detections
-        detector = apriltag(family='tag36h11')
-        detections = detector.detect(image_grey)
-
-        bboxes = []
-        for i in range(len(detections)):
-            # Draw the bounding box detection in the image.
-            bbox = detections[i]['lb-rb-rt-lt']
-            cv2.polylines(image_grey, [np.int32(bbox)], True, (0, 0, 0), 2)
-            bboxes.append(bbox)
-
-        self._image[source_name] = image_grey
+        bboxes, _, image_grey = detect_fiducials(image.data, dim, source_name,
+                                                 with_image=self._display_images)
+        if image_grey is not None:
+            self._image[source_name] = image_grey
         return bboxes
 
+    def benchmark_detection(self, seconds=5.0):
+        """Time apriltag detection on one batch of camera images in this process.
+
+        Returns the detections per second a single core sustains."""
+        image_responses = self._image_client.get_image(self._image_requests)
+        frames = [(response.shot.image.data, (response.shot.image.cols, response.shot.image.rows),
+                   response.source.name) for response in image_responses]
+        count = 0
+        start_time = time.time()
+        while time.time() - start_time < seconds:
+            for frame in frames:
+                detect_fiducials(*frame)
+                count += 1
+        return count / (time.time() - start_time)
+
     def bbox_to_image_object_pts(self, bbox):
         """Determine the object points and image points for the bounding box.
            The origin in object coordinates = top left corner of the fiducial.
@@ -366,11 +646,17 @@ class FollowFiducial(object):
         return fiducial_rt_world
 
     def go_to_tag(self, fiducial_rt_world):
-        """Use the position of the april tag in vision world frame and command the robot."""
+        """Use the position of the april tag in vision world frame and command the robot.
+           A new trajectory command is only sent when the goal has moved or the previous
+           command is no longer driving the robot there; otherwise its feedback is checked."""
         # Compute the go-to point (offset by .5m from the fiducial position) and the heading at
         # this point.
         self._current_tag_world_pose, self._angle_desired = self.offset_tag_pose(
             fiducial_rt_world, self._tag_offset)
+        if not (self._movement_on and self._powered_on):
+            return
+        if self.command_converging(self._current_tag_world_pose, self._angle_desired):
+            return
 
         #Command the robot to go to the tag in kinematic odometry frame
         mobility_params = self.set_mobility_params()
@@ -379,29 +665,33 @@ class FollowFiducial(object):
             goal_heading=self._angle_desired, frame_name=VISION_FRAME_NAME, params=mobility_params,
             body_height=0.0, locomotion_hint=spot_command_pb2.HINT_AUTO)
         end_time = 5.0
-        if self._movement_on and self._powered_on:
-            #Issue the command to the robot
-            self._robot_command_client.robot_command(lease=None, command=tag_cmd,
-                                                     end_time_secs=time.time() + end_time)
-            # #Feedback to check and wait until the robot is in the desired position or timeout
-            start_time = time.time()
-            current_time = time.time()
-            while self._running and (not self.final_state() and current_time - start_time < end_time):
-                time.sleep(.25)
-                current_time = time.time()
-        return
-
-    def final_state(self):
-        """Check if the current robot state is within range of the fiducial position."""
-        robot_state = get_vision_tform_body(self.robot_state.kinematic_state.transforms_snapshot)
-        robot_angle = robot_state.rot.to_yaw()
-        if self._current_tag_world_pose.size != 0:
-            x_dist = abs(self._current_tag_world_pose[0] - robot_state.x)
-            y_dist = abs(self._current_tag_world_pose[1] - robot_state.y)
-            angle = abs(self._angle_desired - robot_angle)
-            if ((x_dist < self._x_eps) and (y_dist < self._y_eps) and (angle < self._angle_eps)):
-                return True
-        return False
+        #Issue the command to the robot
+        self._command_id = self._robot_command_client.robot_command(
+            lease=None, command=tag_cmd, end_time_secs=time.time() + end_time)
+        self._command_goal = (self._current_tag_world_pose, self._angle_desired)
+        self._command_end_time = time.time() + end_time
+        self._at_goal = False
+
+    def command_converging(self, goal, heading):
+        """Check if the last trajectory command still targets this goal and, from its feedback,
+           is walking there or has arrived."""
+        if self._command_id is None or time.time() > self._command_end_time:
+            return False
+        old_goal, old_heading = self._command_goal
+        heading_change = math.atan2(math.sin(heading - old_heading), math.cos(heading - old_heading))
+        if (abs(goal[0] - old_goal[0]) > self._x_eps or abs(goal[1] - old_goal[1]) > self._y_eps or
+                abs(heading_change) > self._angle_eps):
+            return False
+        feedback = self._robot_command_client.robot_command_feedback(self._command_id)
+        mobility = feedback.feedback.synchronized_feedback.mobility_command_feedback
+        if mobility.status != _MOBILITY_PROCESSING:
+            return False
+        status = mobility.se2_trajectory_feedback.status
+        if status == _SE2_FEEDBACK.STATUS_AT_GOAL and not self._at_goal:
+            self._at_goal = True
+            print('Reached the fiducial')
+        return status in (_SE2_FEEDBACK.STATUS_GOING_TO_GOAL, _SE2_FEEDBACK.STATUS_NEAR_GOAL,
+                          _SE2_FEEDBACK.STATUS_AT_GOAL)
 
     def get_desired_angle(self, xhat):
         """Compute heading based on the vector from robot to object."""
@@ -412,7 +702,7 @@ class FollowFiducial(object):
 
     def offset_tag_pose(self, object_rt_world, dist_margin=1.0):
         """Offset the go-to location of the fiducial and compute the desired heading."""
-        robot_rt_world = get_vision_tform_body(self.robot_state.kinematic_state.transforms_snapshot)
+        robot_rt_world = get_vision_tform_body(self.tick_state.kinematic_state.transforms_snapshot)
         robot_to_object_ewrt_world = np.array(
             [object_rt_world.x - robot_rt_world.x, object_rt_world.y - robot_rt_world.y, 0])
         robot_to_object_ewrt_world_norm = robot_to_object_ewrt_world / np.linalg.norm(
@@ -465,12 +755,9 @@ class FollowFiducial(object):
     @staticmethod
     def rotate_image(image, source_name):
         """Rotate the image so that it is always displayed upright."""
-        if source_name == 'frontleft_fisheye_image':
-            image = cv2.rotate(image, rotateCode=0)
-        elif source_name == 'right_fisheye_image':
-            image = cv2.rotate(image, rotateCode=1)
-        elif source_name == 'frontright_fisheye_image':
-            image = cv2.rotate(image, rotateCode=0)
+        code = IMAGE_ROTATIONS.get(source_name)
+        if code is not None:
+            image = cv2.rotate(image, rotateCode=code)
         return image
 
     @staticmethod
@@ -507,6 +794,7 @@ class DisplayImagesAsync(object):
         if self._started:
             return None
         self._sources = self._fiducial_follower.image_sources_list
+        self._fiducial_follower.display_images = True
         self._started = True
         self._thread = threading.Thread(target=self.update)
         self._thread.start()
@@ -531,6 +819,7 @@ class DisplayImagesAsync(object):
     def stop(self):
         """Stop the thread and the image displays."""
         self._started = False
+        self._fiducial_follower.display_images = False
         cv2.destroyAllWindows()
 
 
@@ -572,10 +861,22 @@ def main():
     parser.add_argument(
         '--use-world-objects', default=True, type=lambda x: (str(x).lower() == 'true'),
         help='If fiducials should be from the world object service or the apriltag library.')
+    parser.add_argument('--detector-processes', default=None, type=int,
+                        help='Number of apriltag detector processes (default: one per camera).')
+    parser.add_argument('--tag-id', default=None, type=int,
+                        help='Only follow the fiducial with this tag ID (default: the first seen).')
+    parser.add_argument('--max-fiducial-age', default=FIDUCIAL_MAX_AGE, type=float,
+                        help='Seconds a fiducial pose is followed after its last detection.')
+    parser.add_argument('--loop-hz', default=DEFAULT_LOOP_HZ, type=float,
+                        help='Rate [Hz] of the follow control loop.')
+    parser.add_argument('--track-roi', default=True, type=lambda x: (str(x).lower() == 'true'),
+                        help='Search only around the last detection until the tag is lost.')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Measure apriltag detections per second per core and exit.')
     options = parser.parse_args()
 
     # If requested, attempt import of Apriltag library
-    if not options.use_world_objects:
+    if not options.use_world_objects or options.benchmark:
         try:
             global apriltag
             from apriltag import apriltag
@@ -600,6 +901,12 @@ def main():
                                             'such as the estop SDK example, to configure E-Stop.'
 
             fiducial_follower = FollowFiducial(robot, options)
+            if options.benchmark:
+                rate = fiducial_follower.benchmark_detection()
+                print(f'{rate:.1f} detections/s per core '
+                      f'({len(fiducial_follower.image_sources_list)} camera sources)')
+                fiducial_follower.shutdown_detectors()
+                return True
             time.sleep(.1)
             if not options.use_world_objects and str.lower(sys.platform) != 'darwin':
                 # Display the detected bounding boxes on the images when using the april tag library.
@@ -1,12 +1,38 @@
 # backend/services/spot_singleton.py
 from .spot_client import RealSpotClient, FakeSpotClient
+from .frame_hub import FrameHub
+from .robot_state_poller import DEFAULT_STATE_POLL_HZ
+from .telemetry import TelemetryHub
+from .perception_hub import PerceptionHub
+from .command_jobs import CommandScheduler
+from .visualizer_hub import VisualizerHub
+from .. import config
 from ..config import USE_FAKE_SPOT, SPOT_CONFIG
 
 if USE_FAKE_SPOT:
-    spot_client = FakeSpotClient()
+    # Valgfrit: FAKE_SPOT_CONFIG = {"pattern": "bars", "n_frames": 30, "overlay": True}
+    spot_client = FakeSpotClient(**getattr(config, "FAKE_SPOT_CONFIG", {}))
 else:
     spot_client = RealSpotClient(
         hostname=SPOT_CONFIG["hostname"],
         username=SPOT_CONFIG["username"],
         password=SPOT_CONFIG["password"],
+        # Valgfrit: hvor ofte robot state samples (Hz)
+        state_poll_hz=SPOT_CONFIG.get("state_poll_hz", DEFAULT_STATE_POLL_HZ),
     )
+
+# Fælles frame-broadcaster: én capture-loop pr. kamera, uanset antal viewers
+frame_hub = FrameHub(spot_client)
+
+# Fælles telemetry-kanal: pusher state-ændringer til alle faner
+telemetry_hub = TelemetryHub(spot_client)
+
+# Fælles perception-producer: én perception_stream, delt og encodet én gang pr. besked
+perception_hub = PerceptionHub(spot_client)
+
+# Kommando-kø: robot-kommandoer køres én ad gangen i robottens egen tråd
+command_scheduler = CommandScheduler(spot_client)
+
+# Headless visualizer: én polling-loop for terrain + fiducials, delt af alle browser-viewers
+# Valgfrit: VISUALIZER_CONFIG = {"rate_hz": 2.0, "voxel_size": 0.05}
+visualizer_hub = VisualizerHub(spot_client, **getattr(config, "VISUALIZER_CONFIG", {}))
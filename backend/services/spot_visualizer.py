@@ -19,6 +19,9 @@ from .visualization_utils import (add_numpy_to_vtk_object, get_default_color_map
                                  get_vtk_cube_source, get_vtk_polydata_from_numpy,
                                  make_spot_vtk_hexahedron, se3pose_proto_to_vtk_tf)
 from vtk.util import numpy_support
+from .local_grid_utils import (expand_data_by_rle_count, get_ground_height_in_vision_frame,
+                               get_intensity_grid, get_numpy_data_type, get_terrain_grid,
+                               get_valid_pts, offset_grid_pixels, unpack_grid)
 
 import bosdyn.client
 import bosdyn.client.util
@@ -260,6 +263,10 @@ class RobotStateTimedCallbackEvent(object):
         renwin.GetRenderWindow().Render()
 
 
+# Numpy dtype matching vtkIdType (int64 on most builds), needed to wrap id arrays without copying.
+VTK_ID_DTYPE = numpy_support.get_vtk_to_numpy_typemap()[vtk.VTK_ID_TYPE]
+
+
 class ImageServiceTimedCallbackEvent(object):
     """VTK Callback event for Images."""
 
@@ -267,6 +274,14 @@ class ImageServiceTimedCallbackEvent(object):
         self.client = client
         self.image_sources = image_sources
         self.point_cloud_data = vtk.vtkPolyData()
+        # Point cloud storage reused across ticks. The numpy buffers only grow; VTK arrays wrap slices.
+        self.vtk_points = vtk.vtkPoints()
+        self.vtk_cells = vtk.vtkCellArray()
+        self.point_cloud_data.SetPoints(self.vtk_points)
+        self.point_cloud_data.SetVerts(self.vtk_cells)
+        self.pts_buffer = np.empty((0, 3), dtype=np.float32)
+        self.depth_buffer = np.empty(0, dtype=np.float64)
+        self.ids_buffer = np.empty(0, dtype=VTK_ID_DTYPE)
         self.image_actor = self.init_image_actor()
 
     def get_actor(self):
@@ -284,29 +299,41 @@ class ImageServiceTimedCallbackEvent(object):
         actor.SetMapper(mapper)
         return actor
 
+    def update_point_cloud(self, pts):
+        """Load an Nx3 numpy point cloud into the polydata as points, depth scalars and vertex cells.
+
+        Everything is built from numpy buffers in a few vectorized calls (no per-point VTK calls).
+        The buffers are reused across ticks and only reallocated when a larger cloud arrives.
+        """
+        count = len(pts)
+        if count > len(self.depth_buffer):
+            self.pts_buffer = np.empty((count, 3), dtype=np.float32)
+            self.depth_buffer = np.empty(count, dtype=np.float64)
+            # One id per point; [0..count] doubles as the vertex cell offsets and connectivity.
+            self.ids_buffer = np.arange(count + 1, dtype=VTK_ID_DTYPE)
+        pts_view = self.pts_buffer[:count]
+        pts_view[:] = pts
+        depth_view = self.depth_buffer[:count]
+        depth_view[:] = pts_view[:, 2]
+
+        self.vtk_points.SetData(numpy_support.numpy_to_vtk(pts_view))
+        vtk_depth = numpy_support.numpy_to_vtk(depth_view)
+        vtk_depth.SetName('DepthArray')
+        self.point_cloud_data.GetPointData().SetScalars(vtk_depth)
+        self.point_cloud_data.GetPointData().SetActiveScalars('DepthArray')
+        self.vtk_cells.SetData(numpy_support.numpy_to_vtkIdTypeArray(self.ids_buffer[:count + 1]),
+                               numpy_support.numpy_to_vtkIdTypeArray(self.ids_buffer[:count]))
+        self.vtk_points.Modified()
+        self.point_cloud_data.Modified()
+
     def update_image_actor(self, renwin, event):
         """Request the most recent image and update the VTK renderer."""
         image_responses = self.client.get_image_from_sources(self.image_sources)
 
-        # Create storage for the point cloud.
-        vtkPoints = vtk.vtkPoints()
-        vtkCells = vtk.vtkCellArray()
-        vtkDepth = vtk.vtkDoubleArray()
-        vtkDepth.SetName('DepthArray')
-        self.point_cloud_data.SetPoints(vtkPoints)
-        self.point_cloud_data.SetVerts(vtkCells)
-        self.point_cloud_data.GetPointData().SetScalars(vtkDepth)
-        self.point_cloud_data.GetPointData().SetActiveScalars('DepthArray')
-
         # We requested a single image (hand depth) in the get_image_from_sources call, the first response returned is the result.
         image = image_responses[0]
         pts_in_sensor = depth_image_to_pointcloud(image)
-
-        for pt in pts_in_sensor:
-            pointId = vtkPoints.InsertNextPoint(pt[:])
-            vtkDepth.InsertNextValue(pt[2])
-            vtkCells.InsertNextCell(1)
-            vtkCells.InsertCellPoint(pointId)
+        self.update_point_cloud(pts_in_sensor)
 
         # Use the transforms snapshot to get the vision_T_sensor transform to draw the points in the correct reference frame.
         vision_tform_sensor_proto = get_a_tform_b(image.shot.transforms_snapshot, VISION_FRAME_NAME,
@@ -318,35 +345,7 @@ class ImageServiceTimedCallbackEvent(object):
         renwin.GetRenderWindow().Render()
 
 
-def expand_data_by_rle_count(local_grid_proto, data_type=np.int16):
-    """Expand local grid data to full bytes data using the RLE count."""
-    cells_pz = np.frombuffer(local_grid_proto.local_grid.data, dtype=data_type)
-    cells_pz_full = []
-    # For each value of rle_counts, we expand the cell data at the matching index
-    # to have that many repeated, consecutive values.
-    for i in range(0, len(local_grid_proto.local_grid.rle_counts)):
-        for j in range(0, local_grid_proto.local_grid.rle_counts[i]):
-            cells_pz_full.append(cells_pz[i])
-    return np.array(cells_pz_full)
-
-
-def get_terrain_grid(local_grid_proto):
-    """Generate a 3xN set of points representing the terrain local grid."""
-    cells_pz_full = unpack_grid(local_grid_proto).astype(np.float32)
-    # Populate the x,y values with a complete combination of all possible pairs for the dimensions in the grid extent.
-    ys, xs = np.mgrid[0:local_grid_proto.local_grid.extent.num_cells_x,
-                      0:local_grid_proto.local_grid.extent.num_cells_y]
-    # Numpy vstack makes it so that each column is (x,y,z) for a single terrain point. The height values (z) come from the
-    # terrain grid's data field.
-    pts = np.vstack(
-        [np.ravel(xs).astype(np.float32),
-         np.ravel(ys).astype(np.float32), cells_pz_full]).T
-    pts[:, [0, 1]] *= (local_grid_proto.local_grid.extent.cell_size,
-                       local_grid_proto.local_grid.extent.cell_size)
-    return pts
-
-
-def create_vtk_no_step_grid(proto, robot_state_client):
+def create_vtk_no_step_grid(proto, z_ground_in_vision_frame):
     """Generate VTK polydata for the no step grid from the local grid response."""
     for local_grid_found in proto:
         if local_grid_found.local_grid_type_name == 'no_step':
@@ -357,10 +356,9 @@ def create_vtk_no_step_grid(proto, robot_state_client):
     # Populate the x,y values with a complete combination of all possible pairs for the dimensions in the grid extent.
     ys, xs = np.mgrid[0:local_grid_proto.local_grid.extent.num_cells_x,
                       0:local_grid_proto.local_grid.extent.num_cells_y]
-    # Get the estimated height (z value) of the ground in the vision frame as if the robot was standing.
+    # The estimated height (z value) of the ground in the vision frame as if the robot was standing
+    # is computed once per tick by the caller.
     transforms_snapshot = local_grid_proto.local_grid.transforms_snapshot
-    vision_tform_body = get_a_tform_b(transforms_snapshot, VISION_FRAME_NAME, BODY_FRAME_NAME)
-    z_ground_in_vision_frame = compute_ground_height_in_vision_frame(robot_state_client)
     # Numpy vstack makes it so that each column is (x,y,z) for a single no step grid point. The height values come
     # from the estimated height of the ground plane.
     cell_count = local_grid_proto.local_grid.extent.num_cells_x * local_grid_proto.local_grid.extent.num_cells_y
@@ -386,7 +384,7 @@ def create_vtk_no_step_grid(proto, robot_state_client):
     return polydata
 
 
-def create_vtk_obstacle_grid(proto, robot_state_client):
+def create_vtk_obstacle_grid(proto, z_ground_in_vision_frame):
     """Generate VTK polydata for the obstacle distance grid from the local grid response."""
     for local_grid_found in proto:
         if local_grid_found.local_grid_type_name == 'obstacle_distance':
@@ -398,10 +396,8 @@ def create_vtk_obstacle_grid(proto, robot_state_client):
     ys, xs = np.mgrid[0:local_grid_proto.local_grid.extent.num_cells_x,
                       0:local_grid_proto.local_grid.extent.num_cells_y]
 
-    # Get the estimated height (z value) of the ground in the vision frame.
+    # The estimated height (z value) of the ground in the vision frame is computed once per tick by the caller.
     transforms_snapshot = local_grid_proto.local_grid.transforms_snapshot
-    vision_tform_body = get_a_tform_b(transforms_snapshot, VISION_FRAME_NAME, BODY_FRAME_NAME)
-    z_ground_in_vision_frame = compute_ground_height_in_vision_frame(robot_state_client)
     # Numpy vstack makes it so that each column is (x,y,z) for a single no step grid point. The height values come
     # from the estimated height of the ground plane as if the robot was standing.
     cell_count = local_grid_proto.local_grid.extent.num_cells_x * local_grid_proto.local_grid.extent.num_cells_y
@@ -429,22 +425,6 @@ def create_vtk_obstacle_grid(proto, robot_state_client):
     return polydata
 
 
-def get_valid_pts(local_grid_proto):
-    """Generate a 1xN set of binary indicators whether terrain height grid data point is valid."""
-    cell_flags = unpack_grid(local_grid_proto)
-    return cell_flags
-
-
-def get_intensity_grid(local_grid_proto):
-    """Generate a 3xN set of color intensities for the local grid points."""
-    intensity = unpack_grid(local_grid_proto)
-    # Repeat the same intensity for the (x,y,z) coordinates of an individual cell of the local grid.
-    cell_count = local_grid_proto.local_grid.extent.num_cells_x * local_grid_proto.local_grid.extent.num_cells_y
-    cells_color = np.zeros([cell_count, 4], dtype=np.uint8)
-    cells_color[:, :3] = np.repeat(intensity, 3).reshape(-1, 3)
-    return cells_color
-
-
 def create_vtk_full_terrain_grid(proto):
     """Generate VTK polydata for the terrain (height) grid from the local grid response."""
     # Parse each local grid response to create numpy arrays for each.
@@ -470,83 +450,69 @@ def create_vtk_full_terrain_grid(proto):
     return polydata
 
 
-def offset_grid_pixels(pts, vision_tform_local_grid, cell_size):
-    """Offset the local grid's pixels to be in the world frame instead of the local grid frame."""
-    x_base = vision_tform_local_grid.position.x + cell_size * 0.5
-    y_base = vision_tform_local_grid.position.y + cell_size * 0.5
-    pts[:, 0] += x_base
-    pts[:, 1] += y_base
-    return pts
-
-
-def unpack_grid(local_grid_proto):
-    """Unpack the local grid proto."""
-    # Determine the data type for the bytes data.
-    data_type = get_numpy_data_type(local_grid_proto.local_grid)
-    if data_type is None:
-        print('Cannot determine the dataformat for the local grid.')
-        return None
-    # Decode the local grid.
-    if local_grid_proto.local_grid.encoding == local_grid_pb2.LocalGrid.ENCODING_RAW:
-        full_grid = np.frombuffer(local_grid_proto.local_grid.data, dtype=data_type)
-    elif local_grid_proto.local_grid.encoding == local_grid_pb2.LocalGrid.ENCODING_RLE:
-        full_grid = expand_data_by_rle_count(local_grid_proto, data_type=data_type)
-    else:
-        # Return nothing if there is no encoding type set.
-        return None
-    # Apply the offset and scaling to the local grid.
-    if local_grid_proto.local_grid.cell_value_scale == 0:
-        return full_grid
-    full_grid_float = full_grid.astype(np.float64)
-    full_grid_float *= local_grid_proto.local_grid.cell_value_scale
-    full_grid_float += local_grid_proto.local_grid.cell_value_offset
-    return full_grid_float
-
-
-def get_numpy_data_type(local_grid_proto):
-    """Convert the cell format of the local grid proto to a numpy data type."""
-    if local_grid_proto.cell_format == local_grid_pb2.LocalGrid.CELL_FORMAT_UINT16:
-        return np.uint16
-    elif local_grid_proto.cell_format == local_grid_pb2.LocalGrid.CELL_FORMAT_INT16:
-        return np.int16
-    elif local_grid_proto.cell_format == local_grid_pb2.LocalGrid.CELL_FORMAT_UINT8:
-        return np.uint8
-    elif local_grid_proto.cell_format == local_grid_pb2.LocalGrid.CELL_FORMAT_INT8:
-        return np.int8
-    elif local_grid_proto.cell_format == local_grid_pb2.LocalGrid.CELL_FORMAT_FLOAT64:
-        return np.float64
-    elif local_grid_proto.cell_format == local_grid_pb2.LocalGrid.CELL_FORMAT_FLOAT32:
-        return np.float32
-    else:
-        return None
-
-
-def get_vtk_from_local_grid_proto(proto, robot_state_client):
-    """Generate VTK polydata for all different grid types from the local grid proto."""
+# The local grid sources each displayed layer (--local-grid choice) is built from.
+LOCAL_GRID_SOURCES = {
+    'terrain': ['terrain', 'terrain_valid', 'intensity'],
+    'no-step': ['no_step'],
+    'obstacle-distance': ['obstacle_distance'],
+}
+# Layers drawn at the estimated ground height, which needs a robot state sample.
+GROUND_HEIGHT_LAYERS = ('no-step', 'obstacle-distance')
+# Oldest robot state (relative to the local grid's acquisition time) reused for the ground height.
+ROBOT_STATE_MAX_AGE = 0.5  # seconds
+
+
+def get_local_grid_sources(local_grid_types):
+    """The local grid type names to request for the selected layers (no duplicates, stable order)."""
+    sources = []
+    for layer in local_grid_types:
+        for name in LOCAL_GRID_SOURCES.get(layer, []):
+            if name not in sources:
+                sources.append(name)
+    return sources
+
+
+def needs_ground_height(local_grid_types):
+    return any(layer in local_grid_types for layer in GROUND_HEIGHT_LAYERS)
+
+
+def get_vtk_from_local_grid_proto(proto, z_ground_in_vision_frame=None,
+                                  local_grid_types=tuple(LOCAL_GRID_SOURCES)):
+    """Generate VTK polydata for the selected grid types from the local grid proto.
+
+    Returns (obstacle_distance, no_step, terrain); layers that are not selected are None.
+    `z_ground_in_vision_frame` is only needed for the no-step and obstacle-distance layers.
+    """
+    obstacle_distance = no_step = terrain = None
     # Generate the obstacle distance grid
-    obstacle_distance = create_vtk_obstacle_grid(proto, robot_state_client)
+    if 'obstacle-distance' in local_grid_types:
+        obstacle_distance = create_vtk_obstacle_grid(proto, z_ground_in_vision_frame)
     # Generate the no step grid
-    no_step = create_vtk_no_step_grid(proto, robot_state_client)
+    if 'no-step' in local_grid_types:
+        no_step = create_vtk_no_step_grid(proto, z_ground_in_vision_frame)
     # Generate the terrain grid
-    terrain = create_vtk_full_terrain_grid(proto)
+    if 'terrain' in local_grid_types:
+        terrain = create_vtk_full_terrain_grid(proto)
     return obstacle_distance, no_step, terrain
 
 
 def compute_ground_height_in_vision_frame(robot_state_client):
     """Get the z-height of the ground plane in vision frame from the current robot state."""
-    robot_state = robot_state_client.get_robot_state()
-    vision_tform_ground_plane = get_a_tform_b(robot_state.kinematic_state.transforms_snapshot,
-                                              VISION_FRAME_NAME, GROUND_PLANE_FRAME_NAME)
-    return vision_tform_ground_plane.position.z
+    return get_ground_height_in_vision_frame(robot_state_client.get_robot_state())
 
 
 class LocalGridTimedCallbackEvent(object):
     """VTK Callback event for local grids."""
 
-    def __init__(self, local_grid_client, robot_state_client, local_grid_types):
+    def __init__(self, local_grid_client, robot_state_client, local_grid_types, robot_state_timer=None):
         self.local_grid_client = local_grid_client
         self.robot_state_client = robot_state_client
         self.local_grid_types = local_grid_types
+        # Only request the grid sources the selected layers are built from.
+        self.local_grid_sources = get_local_grid_sources(local_grid_types)
+        # When given, reuse the robot state that timer last sampled instead of another RPC, as long as
+        # it is at most ROBOT_STATE_MAX_AGE older than the local grid.
+        self.robot_state_timer = robot_state_timer
         self.robot_state = None
         self.terrain_grid_actor = None
         self.obstacle_grid_actor = None
@@ -571,13 +537,42 @@ class LocalGridTimedCallbackEvent(object):
             grid_actors.append(self.terrain_grid_actor)
         return grid_actors
 
+    def ground_height(self, proto=None):
+        """Ground height for this tick from a single robot state sample (None if no layer needs it).
+
+        The robot state timer's sample is only reused when it was acquired at most
+        ROBOT_STATE_MAX_AGE before the local grids in proto; otherwise a fresh state is requested.
+        """
+        if not needs_ground_height(self.local_grid_types):
+            return None
+        robot_state = None
+        if self.robot_state_timer is not None:
+            robot_state = self.robot_state_timer.robot_state
+        if robot_state is None or self.robot_state_age(robot_state, proto) > ROBOT_STATE_MAX_AGE:
+            robot_state = self.robot_state_client.get_robot_state()
+        self.robot_state = robot_state
+        return get_ground_height_in_vision_frame(robot_state)
+
+    @staticmethod
+    def robot_state_age(robot_state, proto):
+        """Seconds between the robot state and the newest local grid (both in robot time)."""
+        if not proto:
+            return math.inf
+        grid_nsec = max(timestamp_to_nsec(local_grid_proto.local_grid.acquisition_time)
+                        for local_grid_proto in proto)
+        state_nsec = timestamp_to_nsec(robot_state.kinematic_state.acquisition_timestamp)
+        return (grid_nsec - state_nsec) * 1e-9
+
+    def get_local_grid_polydata(self):
+        """Request the selected local grids and build polydata for the selected layers only."""
+        proto = self.local_grid_client.get_local_grids(self.local_grid_sources)
+        return proto, get_vtk_from_local_grid_proto(proto, self.ground_height(proto),
+                                                     self.local_grid_types)
+
     def update_local_grid_actors(self, renwin, event):
         """Request the most recent local grid and update the VTK renderer."""
-        proto = self.local_grid_client.get_local_grids(
-            ['terrain', 'terrain_valid', 'intensity', 'no_step', 'obstacle_distance'])
-        # Generate the polydata for each local grid source.
-        obstacle_distance, no_step, terrain = get_vtk_from_local_grid_proto(
-            proto, self.robot_state_client)
+        # Generate the polydata for each selected local grid source.
+        _, (obstacle_distance, no_step, terrain) = self.get_local_grid_polydata()
         # Update the polydata with the newest local grid data and re-render the windows.
         if 'no-step' in self.local_grid_types:
             self.update_polydata_points(self.no_step_polydata, no_step)
@@ -589,25 +584,28 @@ class LocalGridTimedCallbackEvent(object):
         renwin.GetRenderWindow().Render()
 
     def update_polydata_points(self, old_polydata, new_polydata):
-        """Update the polydata of the existing VTK actor with the new local grid data."""
-        old_polydata_pts = old_polydata.GetPoints()
-        # Update the polydata with the new terrain points and intensities.
-        for i in range(0, new_polydata.GetNumberOfPoints()):
-            new_point = new_polydata.GetPoint(i)
-            if i < old_polydata.GetNumberOfPoints():
-                old_polydata_pts.SetPoint(i, new_point)
-            else:
-                old_polydata_pts.InsertNextPoint(new_point)
+        """Update the polydata of the existing VTK actor with the new local grid data.
+
+        The new polydata's point and color arrays wrap numpy buffers (numpy_support, no copy), so
+        the existing polydata simply takes over those arrays. This is a constant number of VTK calls
+        per grid regardless of cell count, keeps the colors in sync with the points and drops stale
+        points when the grid shrinks.
+        """
+        old_polydata.SetPoints(new_polydata.GetPoints())
+        old_point_data = old_polydata.GetPointData()
+        new_point_data = new_polydata.GetPointData()
+        for i in range(new_point_data.GetNumberOfArrays()):
+            array = new_point_data.GetArray(i)
+            old_point_data.RemoveArray(array.GetName())
+            old_point_data.AddArray(array)
+        if new_point_data.GetNumberOfArrays() > 0:
+            old_point_data.SetActiveScalars(new_point_data.GetArrayName(0))
         old_polydata.Modified()
 
     def init_local_grid_actors(self):
         """Initialize VTK actor objects for the current local grids."""
-        # Request the different local grids to create a local grid.
-        proto = self.local_grid_client.get_local_grids(
-            ['terrain', 'terrain_valid', 'intensity', 'no_step', 'obstacle_distance'])
-        # Generate the polydata for each local grid source.
-        obstacle_distance, no_step, terrain = get_vtk_from_local_grid_proto(
-            proto, self.robot_state_client)
+        # Request the selected local grids and generate the polydata for each of them.
+        proto, (obstacle_distance, no_step, terrain) = self.get_local_grid_polydata()
         # Create a VTK actor for the local grid.
         for local_grid in proto:
             if local_grid.local_grid_type_name == 'terrain' and 'terrain' in self.local_grid_types:
@@ -661,7 +659,6 @@ def main():
     robot.authenticate(SPOT_CONFIG["username"], SPOT_CONFIG["password"])
 
 
-
     robot.time_sync.wait_for_sync()
 
     # Set up the clients for getting Spot's perception scene.
@@ -691,7 +688,7 @@ def main():
     renderer.AddActor(robot_state_actor)
 
     local_grid_timer = LocalGridTimedCallbackEvent(local_grid_client, robot_state_client,
-                                                   options.local_grid)
+                                                   options.local_grid, robot_state_timer)
     grid_actors = local_grid_timer.get_actors()
     for actor in grid_actors:
         renderer.AddActor(actor)
@@ -0,0 +1,115 @@
+# backend/services/telemetry.py
+from __future__ import annotations
+from typing import AsyncIterator, Dict, Optional
+import asyncio, json, time
+
+from .frame_hub import LatestSlot
+
+# Hvor ofte snapshottet tjekkes for ændringer (sek.). Ændringer inden for samme
+# interval slås sammen til én besked.
+TELEMETRY_INTERVAL = 0.25
+# SSE kommentar så proxies ikke lukker en stille forbindelse (sek.)
+KEEPALIVE_INTERVAL = 15.0
+# Decimaler batteriprocenten sammenlignes med (samme som UI'et viser)
+PERCENT_DECIMALS = 1
+
+
+def _view(values: Dict) -> Dict:
+    """Det UI'et viser: procent, batteristatus, online/power/estop/lease.
+
+    Spænding, strøm og temperaturer svinger ved næsten hvert sample, så de
+    indgår ikke i sammenligningen – de sendes kun med når noget her ændrer sig.
+    """
+    battery = values.get("battery") or {}
+    percent = battery.get("battery_percentage")
+    return {
+        "online": values.get("online"),
+        "battery_percentage": round(percent, PERCENT_DECIMALS) if percent is not None else None,
+        "battery_status": battery.get("status"),
+        "power": values.get("power"),
+        "estop": values.get("estop"),
+        "lease": values.get("lease"),
+    }
+
+
+class TelemetryHub:
+    """Pusher batteri, power, estop og lease state til alle abonnenter.
+
+    Én task læser robot-state snapshottet og publicerer kun når det UI'et
+    viser (afrundet, se `_view`) har ændret sig. Hver ændring serialiseres
+    én gang til JSON, som alle abonnenter deler – både /events websocket'en
+    og SSE-endpointet.
+    """
+
+    def __init__(self, client, interval: float = TELEMETRY_INTERVAL):
+        self._client = client
+        self.interval = interval
+        self._slot = LatestSlot()
+        self._last: Optional[Dict] = None
+        self._task: Optional[asyncio.Task] = None
+        self.subscribers = 0
+        self.published = 0
+
+    def _read(self) -> Dict:
+        state = self._client.state_snapshot()
+        return {
+            "online": state.get("online"),
+            "battery": state.get("battery"),
+            "power": state.get("power"),
+            "estop": state.get("estop"),
+            "lease": state.get("lease"),
+        }
+
+    def _publish_if_changed(self):
+        values = self._read()
+        view = _view(values)
+        if view == self._last:
+            return
+        self._last = view
+        self._slot.publish(json.dumps(dict(values, type="telemetry", ts=time.time()), separators=(",", ":")))
+        self.published += 1
+
+    async def _run(self):
+        while True:
+            try:
+                self._publish_if_changed()
+            except Exception as e:
+                print("[TelemetryHub] fejl:", e)
+            await asyncio.sleep(self.interval)
+
+    async def subscribe(self, keepalive: Optional[float] = KEEPALIVE_INTERVAL) -> AsyncIterator[Optional[str]]:
+        """JSON beskeder: nuværende state med det samme, derefter kun ændringer.
+
+        Med `keepalive` kommer der None hvis intet er sket i så mange sekunder.
+        """
+        self.subscribers += 1
+        if self._task is None or self._task.done():
+            self._publish_if_changed()
+            self._task = asyncio.create_task(self._run())
+        last = 0
+        try:
+            while True:
+                try:
+                    last, payload = await asyncio.wait_for(self._slot.wait_newer(last), keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield payload
+        finally:
+            self.subscribers -= 1
+            if self.subscribers <= 0 and self._task is not None:
+                self._task.cancel()
+                self._task = None
+                self._last = None   # næste abonnent får en frisk besked
+
+    def stats(self) -> Dict:
+        return {"subscribers": self.subscribers, "published": self.published}
+
+
+async def sse(messages: AsyncIterator[Optional[str]], event: str) -> AsyncIterator[bytes]:
+    """Server-Sent Events fra en strøm af JSON beskeder (None = keepalive)."""
+    async for payload in messages:
+        yield b": keepalive\n\n" if payload is None else f"event: {event}\ndata: {payload}\n\n".encode()
+
+
+__all__ = ["TelemetryHub", "TELEMETRY_INTERVAL", "sse"]
@@ -0,0 +1,175 @@
+# backend/services/visualizer_hub.py
+from __future__ import annotations
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import asyncio, struct, time
+import numpy as np
+
+from bosdyn.client.frame_helpers import VISION_FRAME_NAME, get_a_tform_b
+
+from .frame_hub import LatestSlot
+from .local_grid_utils import get_terrain_grid, offset_grid_pixels, unpack_grid
+from .spot_async import run_blocking
+
+# Hvor ofte robotten polles for local grids / world objects (Hz)
+DEFAULT_RATE_HZ = 2.0
+# Kantlængde (m) på voxel-gitteret punkterne tyndes ud med (0 = ingen udtynding)
+DEFAULT_VOXEL_SIZE = 0.05
+
+TERRAIN_SOURCES = ["terrain", "terrain_valid"]
+
+# Binær frame (little-endian, alt 4-byte aligned så browseren kan lave
+# Float32Array views direkte på ArrayBuffer'en uden at kopiere):
+#
+#   0  magic "SV" | version u8 | reserveret u8
+#   4  n_points u32 | 8 n_fiducials u32 | 12 seq u32
+#   16 body pose: x y z qw qx qy qz (7 x f32)
+#   44 punkter: n_points x (x y z) f32           -> BufferAttribute(position, 3)
+#   .. fiducials: n_fiducials x (x y z tag_id) f32
+MAGIC = b"SV"
+VERSION = 1
+_HEADER = struct.Struct("<2sBBIII7f")
+HEADER_SIZE = _HEADER.size   # 44
+
+
+def voxel_downsample(pts: np.ndarray, voxel_size: float) -> np.ndarray:
+    """Behold ét punkt (det første) pr. voxel af størrelse `voxel_size`."""
+    if voxel_size <= 0 or len(pts) == 0:
+        return pts
+    keys = np.floor(pts / voxel_size).astype(np.int64)
+    keys -= keys.min(axis=0)
+    linear = np.ravel_multi_index(keys.T, tuple(keys.max(axis=0) + 1))
+    _, first = np.unique(linear, return_index=True)
+    return pts[np.sort(first)]
+
+
+def terrain_points(grids) -> np.ndarray:
+    """Terrain-gitteret som Nx3 float32 punkter i vision-frame (kun gyldige celler)."""
+    by_name = {g.local_grid_type_name: g for g in grids}
+    terrain = by_name.get("terrain")
+    if terrain is None:
+        return np.empty((0, 3), dtype=np.float32)
+    vision_tform_local_grid = get_a_tform_b(terrain.local_grid.transforms_snapshot, VISION_FRAME_NAME,
+                                            terrain.local_grid.frame_name_local_grid_data)
+    pts = offset_grid_pixels(get_terrain_grid(terrain), vision_tform_local_grid,
+                             terrain.local_grid.extent.cell_size)
+    valid = by_name.get("terrain_valid")
+    if valid is not None:
+        mask = unpack_grid(valid)
+        if mask is not None and len(mask) == len(pts):
+            pts = pts[mask != 0]
+    return pts.astype(np.float32, copy=False)
+
+
+def fiducial_points(world_objects) -> np.ndarray:
+    """(x, y, z, tag_id) i vision-frame for hvert AprilTag world object."""
+    rows: List[Tuple[float, float, float, float]] = []
+    for obj in world_objects:
+        if not obj.HasField("apriltag_properties"):
+            continue
+        tag = obj.apriltag_properties
+        pose = get_a_tform_b(obj.transforms_snapshot, VISION_FRAME_NAME, tag.frame_name_fiducial)
+        if pose is not None:
+            rows.append((pose.x, pose.y, pose.z, float(tag.tag_id)))
+    return np.asarray(rows, dtype=np.float32).reshape(-1, 4)
+
+
+def encode_frame(seq: int, points: np.ndarray, fiducials: np.ndarray, body_pose=None) -> bytes:
+    """Pak én visualizer-frame (se formatet øverst)."""
+    if body_pose is None:
+        pose = (0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0)
+    else:
+        rot = body_pose.rotation
+        pose = (body_pose.x, body_pose.y, body_pose.z, rot.w, rot.x, rot.y, rot.z)
+    header = _HEADER.pack(MAGIC, VERSION, 0, len(points), len(fiducials), seq & 0xFFFFFFFF, *pose)
+    return b"".join((header, np.ascontiguousarray(points, dtype="<f4").tobytes(),
+                     np.ascontiguousarray(fiducials, dtype="<f4").tobytes()))
+
+
+class VisualizerHub:
+    """Headless visualizer: én polling-loop pr. robot, delt af alle browser-viewers.
+
+    Henter terrain local grids og fiducials med `rate_hz`, genbruger de samme
+    numpy-helpers som VTK-visualizeren (unpack_grid, get_terrain_grid, ...),
+    tynder punkterne ud på et voxel-gitter og pakker det hele én gang til en
+    binær Float32 frame som alle websocket-viewers får. Loopet startes ved
+    første viewer og stoppes når den sidste går.
+    """
+
+    def __init__(self, client, rate_hz: float = DEFAULT_RATE_HZ, voxel_size: float = DEFAULT_VOXEL_SIZE):
+        self._client = client
+        self.rate_hz = rate_hz
+        self.voxel_size = voxel_size
+        self._slot = LatestSlot()
+        self._task: Optional[asyncio.Task] = None
+        self.viewers = 0
+        self.errors = 0
+        self.last_build_ms = 0.0
+        self.last_points = 0
+        self.last_bytes = 0
+
+    def _build(self, grids, world_objects, body_pose, seq: int) -> bytes:
+        """Decode + udtynding + pakning (blokkerende, kører i trådpuljen)."""
+        pts = voxel_downsample(terrain_points(grids), self.voxel_size)
+        self.last_points = len(pts)
+        return encode_frame(seq, pts, fiducial_points(world_objects), body_pose)
+
+    async def _tick(self):
+        t0 = time.perf_counter()
+        grids, world_objects = await asyncio.gather(
+            self._client.local_grids(TERRAIN_SOURCES), self._client.world_objects()
+        )
+        frame = await run_blocking(self._build, grids, world_objects, self._client.body_pose(),
+                                   self._slot.seq + 1)
+        self.last_build_ms = (time.perf_counter() - t0) * 1000.0
+        self.last_bytes = len(frame)
+        self._slot.publish(frame)
+
+    async def _run(self):
+        period = 1.0 / self.rate_hz
+        while True:
+            t0 = time.monotonic()
+            try:
+                await self._tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                print("[VisualizerHub] fejl:", e)
+                await asyncio.sleep(1.0)
+            await asyncio.sleep(max(0.0, period - (time.monotonic() - t0)))
+
+    async def subscribe(self, fps: Optional[float] = None) -> AsyncIterator[bytes]:
+        """Binære frames; `fps` lofter hvor ofte netop denne viewer får en ny."""
+        self.viewers += 1
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        min_interval = 1.0 / fps if fps else 0.0
+        last = 0
+        try:
+            while True:
+                last, frame = await self._slot.wait_newer(last)
+                yield frame
+                if min_interval:
+                    await asyncio.sleep(min_interval)
+        finally:
+            self.viewers -= 1
+            if self.viewers <= 0 and self._task is not None:
+                self._task.cancel()
+                self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "viewers": self.viewers,
+            "rate_hz": self.rate_hz,
+            "voxel_size": self.voxel_size,
+            "frames": self._slot.seq,
+            "errors": self.errors,
+            "last_build_ms": round(self.last_build_ms, 2),
+            "last_points": self.last_points,
+            "last_bytes": self.last_bytes,
+        }
+
+
+__all__ = ["VisualizerHub", "encode_frame", "voxel_downsample", "terrain_points", "fiducial_points",
+           "HEADER_SIZE", "DEFAULT_RATE_HZ", "DEFAULT_VOXEL_SIZE"]
@@ -0,0 +1,135 @@
+# backend/services/world_perception.py
+from __future__ import annotations
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+from bosdyn.api import world_object_pb2
+from bosdyn.client.frame_helpers import BODY_FRAME_NAME, VISION_FRAME_NAME, get_a_tform_b
+
+# Kantlængde (m) på den terning vi projicerer for world objects uden egen størrelse
+DEFAULT_OBJECT_SIZE = 0.3
+
+
+def _pinhole(source):
+    """(fx, fy, cx, cy) fra en ImageSource – forvrængning ignoreres (fisheye er derfor ca.)."""
+    if source.HasField("pinhole"):
+        intr = source.pinhole.intrinsics
+    elif source.HasField("pinhole_brown_conrady"):
+        intr = source.pinhole_brown_conrady.intrinsics.pinhole_intrinsics
+    elif source.HasField("kannala_brandt"):
+        intr = source.kannala_brandt.intrinsics.pinhole_intrinsics
+    else:
+        return None
+    return (intr.focal_length.x, intr.focal_length.y, intr.principal_point.x, intr.principal_point.y)
+
+
+def _corners(half: Tuple[float, float, float]) -> np.ndarray:
+    """De 8 hjørner (8x3) af en kasse centreret i objektets frame."""
+    signs = np.array([[sx, sy, sz] for sx in (-1, 1) for sy in (-1, 1) for sz in (-1, 1)], dtype=np.float64)
+    return signs * np.asarray(half, dtype=np.float64)
+
+
+class CameraModel:
+    """Intrinsics, billedstørrelse og body->kamera transform for én kamera source.
+
+    Alt er statisk for robotten, så det hentes én gang fra et image-svar.
+    """
+
+    def __init__(self, image_response):
+        shot = image_response.shot
+        self.source = image_response.source.name
+        self.size = (shot.image.cols, shot.image.rows)
+        self.intrinsics = _pinhole(image_response.source)
+        self.camera_tform_body = get_a_tform_b(shot.transforms_snapshot, shot.frame_name_image_sensor,
+                                               BODY_FRAME_NAME)
+
+    def project(self, camera_pts: np.ndarray) -> Optional[List[float]]:
+        """Bounding box [x, y, w, h] (pixels) for punkter i kamera-frame, eller None."""
+        if self.intrinsics is None:
+            return None
+        pts = camera_pts[camera_pts[:, 2] > 0.05]   # kun punkter foran kameraet
+        if len(pts) == 0:
+            return None
+        fx, fy, cx, cy = self.intrinsics
+        u = fx * pts[:, 0] / pts[:, 2] + cx
+        v = fy * pts[:, 1] / pts[:, 2] + cy
+        w, h = self.size
+        x0, x1 = max(0.0, float(u.min())), min(float(w), float(u.max()))
+        y0, y1 = max(0.0, float(v.min())), min(float(h), float(v.max()))
+        if x1 <= x0 or y1 <= y0:
+            return None     # helt uden for billedet
+        return [round(x0, 1), round(y0, 1), round(x1 - x0, 1), round(y1 - y0, 1)]
+
+
+class WorldObjectProjector:
+    """Omsætter world objects til 2D bokse i et kamerabillede.
+
+    Objektets geometri i vision-frame (hjørnepunkter) caches pr. objekt-id og
+    genberegnes kun når objektets `acquisition_time` ændrer sig. Hver tick
+    laves så kun én matrix-multiplikation pr. objekt for at flytte hjørnerne
+    ind i kamera-frame med robottens aktuelle pose.
+    """
+
+    def __init__(self, object_size: float = DEFAULT_OBJECT_SIZE):
+        self.object_size = object_size
+        # id -> (acquisition_time, label, hjørner i vision-frame 8x3)
+        self._cache: Dict[str, Tuple[Tuple[int, int], str, np.ndarray]] = {}
+        self.recomputed = 0
+
+    def _geometry(self, obj) -> Optional[Tuple[str, str, np.ndarray]]:
+        """(id, label, vision-frame hjørner) for ét world object – fra cache hvis uændret."""
+        if obj.HasField("apriltag_properties"):
+            tag = obj.apriltag_properties
+            key, label = f"tag-{tag.tag_id}", f"fiducial {tag.tag_id}"
+        else:
+            key, label = f"obj-{obj.id}", obj.name or "object"
+        stamp = (obj.acquisition_time.seconds, obj.acquisition_time.nanos)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == stamp:
+            return key, cached[1], cached[2]
+
+        if obj.HasField("apriltag_properties"):
+            tag = obj.apriltag_properties
+            frame = tag.frame_name_fiducial_filtered or tag.frame_name_fiducial
+            # Tagget ligger i x/y-planet af fiducial-frame (dimensions i meter,
+            # ligesom spot_visualizer skalerer sin fiducial-actor)
+            half = (tag.dimensions.x / 2.0, tag.dimensions.y / 2.0, 0.0)
+        else:
+            frame = obj.image_properties.frame_name_image_coordinates
+            half = (self.object_size / 2.0,) * 3
+        vision_tform_obj = get_a_tform_b(obj.transforms_snapshot, VISION_FRAME_NAME, frame) if frame else None
+        if vision_tform_obj is None:
+            return None
+        corners = vision_tform_obj.transform_cloud(_corners(half))
+        self._cache[key] = (stamp, label, corners)
+        self.recomputed += 1
+        return key, label, corners
+
+    def boxes(self, world_objects, camera: CameraModel, body_tform_vision) -> List[Dict]:
+        """Bokse (samme skema som perception_stream) for de objekter kameraet kan se."""
+        camera_tform_vision = camera.camera_tform_body * body_tform_vision
+        boxes: List[Dict] = []
+        seen = set()
+        for obj in world_objects:
+            geom = self._geometry(obj)
+            if geom is None:
+                continue
+            key, label, corners = geom
+            seen.add(key)
+            xywh = camera.project(camera_tform_vision.transform_cloud(corners))
+            if xywh is not None:
+                boxes.append({"id": key, "label": label, "score": 1.0, "xywh": xywh})
+        # Glem objekter robotten ikke længere rapporterer
+        for key in [k for k in self._cache if k not in seen]:
+            del self._cache[key]
+        return boxes
+
+
+def scene_key(world_objects) -> Tuple:
+    """Id + acquisition_time for alle objekter – ændrer sig kun når scenen gør."""
+    return tuple(sorted((o.id, o.acquisition_time.seconds, o.acquisition_time.nanos) for o in world_objects))
+
+
+PERCEPTION_OBJECT_TYPES = [world_object_pb2.WORLD_OBJECT_APRILTAG, world_object_pb2.WORLD_OBJECT_IMAGE_COORDINATES]
+
+__all__ = ["CameraModel", "WorldObjectProjector", "scene_key", "PERCEPTION_OBJECT_TYPES", "DEFAULT_OBJECT_SIZE"]
@@ -11,6 +11,53 @@ const feedbackEl = document.getElementById('feedback');
 const vizCanvas  = document.getElementById('vizCanvas'); // 3D visualizer canvas
 
 
+// ------------------ Telemetry (push) ------------------
+function setOnline(online) {
+  if (online) {
+    dotEl.classList.replace('offline', 'online');
+    statusEl.textContent = 'Online';
+  } else {
+    dotEl.classList.replace('online', 'offline');
+    statusEl.textContent = 'Offline';
+  }
+}
+
+function setBattery(battery) {
+  const el = document.getElementById("battery");
+  if (battery && battery.battery_percentage != null) {
+    el.textContent = `🔋 ${battery.battery_percentage.toFixed(1)}%`;
+  } else {
+    el.textContent = "🔋 N/A";
+  }
+}
+
+// Håndtering af push-beskeder pr. `type` fra /events websocket'en
+const eventHandlers = {
+  telemetry: (data) => {
+    setOnline(data.online);
+    setBattery(data.battery);
+  },
+};
+
+// Én websocket pr. fane – serveren pusher kun når noget ændrer sig. En
+// websocket i stedet for SSE: EventSource ville tage den sidste af browserens
+// 6 HTTP/1.1 forbindelser (5 går til kamera-streams) og blokere alle fetches.
+function subscribeEvents(id) {
+  const proto = location.protocol === "https:" ? "wss" : "ws";
+  const ws = new WebSocket(`${proto}://${location.host}/api/robots/${encodeURIComponent(id)}/events`);
+  ws.onmessage = (ev) => {
+    const data = JSON.parse(ev.data);
+    const handler = eventHandlers[data.type];
+    if (handler) handler(data);
+  };
+  // Vis offline og genforbind efter et par sekunder
+  ws.onclose = () => {
+    setOnline(false);
+    setTimeout(() => subscribeEvents(id), 2000);
+  };
+  return ws;
+}
+
 // ------------------ Status ------------------
 async function updateStatus(id) {
   try {
@@ -63,13 +110,15 @@ async function init() {
   const robot = await res.json();
   titleEl.textContent = robot.name || id;
 
-  // Status loop
-  await updateStatus(id);
-  setInterval(() => updateStatus(id), 5000);
-
-  // Battery loop
-  await updateBattery(id);
-  setInterval(() => updateBattery(id), 5000);
+  // Status + batteri: push via /events websocket'en (ellers polling)
+  if (window.WebSocket) {
+    subscribeEvents(id);
+  } else {
+    await updateStatus(id);
+    setInterval(() => updateStatus(id), 5000);
+    await updateBattery(id);
+    setInterval(() => updateBattery(id), 5000);
+  }
 }
 
 // ------------------ 3D Visualizer ------------------
@@ -98,28 +147,49 @@ function init3D() {
   light.position.set(2, 2, 2);
   scene.add(light);
 
-  // WebSocket til Spot visualizer endpoint
+  // Spot's vision-frame har z op
+  camera.up.set(0, 0, 1);
+  camera.position.set(-3, 0, 2);
+
+  // Punktskyen genbruger samme geometry; hver frame får bare nye position-data
+  const geometry = new THREE.BufferGeometry();
+  pointCloud = new THREE.Points(geometry, new THREE.PointsMaterial({ color: 0x00ff00, size: 0.03 }));
+  scene.add(pointCloud);
+  const fiducialGeometry = new THREE.BufferGeometry();
+  scene.add(new THREE.Points(fiducialGeometry, new THREE.PointsMaterial({ color: 0xff3333, size: 0.15 })));
+  const body = new THREE.Mesh(
+    new THREE.BoxGeometry(1.1, 0.5, 0.2),
+    new THREE.MeshBasicMaterial({ color: 0xffcc00, wireframe: true })
+  );
+  scene.add(body);
+
+  // WebSocket til Spot visualizer endpoint – binære Float32 frames
+  // (layout: backend/services/visualizer_hub.py)
+  const HEADER_SIZE = 44;
   const proto = location.protocol === "https:" ? "wss" : "ws";
   const ws = new WebSocket(`${proto}://${location.host}/api/robots/spot-001/visualizer`);
+  ws.binaryType = "arraybuffer";
 
   ws.onmessage = (ev) => {
-    const data = JSON.parse(ev.data);
-    if (!data.points) return;
-
-    const positions = new Float32Array(data.points.length * 3);
-    for (let i = 0; i < data.points.length; i++) {
-      positions[i*3 + 0] = data.points[i][0];
-      positions[i*3 + 1] = data.points[i][1];
-      positions[i*3 + 2] = data.points[i][2];
-    }
-
-    const geometry = new THREE.BufferGeometry();
+    const buf = ev.data;
+    const view = new DataView(buf);
+    if (view.getUint8(0) !== 0x53 || view.getUint8(1) !== 0x56) return;   // "SV"
+    const nPoints = view.getUint32(4, true);
+    const nFiducials = view.getUint32(8, true);
+    const pose = new Float32Array(buf, 16, 7);
+
+    // Views direkte på ArrayBuffer'en – ingen kopi eller parsing pr. punkt
+    const positions = new Float32Array(buf, HEADER_SIZE, nPoints * 3);
     geometry.setAttribute("position", new THREE.BufferAttribute(positions, 3));
+    geometry.computeBoundingSphere();
 
-    const material = new THREE.PointsMaterial({ color: 0x00ff00, size: 0.01 });
-    if (pointCloud) scene.remove(pointCloud);
-    pointCloud = new THREE.Points(geometry, material);
-    scene.add(pointCloud);
+    const fiducials = new Float32Array(buf, HEADER_SIZE + nPoints * 12, nFiducials * 4);
+    fiducialGeometry.setAttribute("position", new THREE.InterleavedBufferAttribute(
+      new THREE.InterleavedBuffer(fiducials, 4), 3, 0));
+    fiducialGeometry.computeBoundingSphere();
+
+    body.position.set(pose[0], pose[1], pose[2]);
+    body.quaternion.set(pose[4], pose[5], pose[6], pose[3]);
   };
 
   function animate() {
@@ -146,14 +216,64 @@ function showView(view) {
 }
 
 // ------------------ Demo Endpoints ------------------
+// Seneste job vi har startet – feedback viser kun dets status
+let currentJob = null;
+let currentJobDone = false;
+
+function showJob(job) {
+  if (!job || job.id !== currentJob || currentJobDone) return;
+  currentJobDone = ["succeeded", "failed", "cancelled"].includes(job.status);
+  if (job.status === "failed") {
+    feedbackEl.textContent = job.error || "Fejl";
+    feedbackEl.style.color = "red";
+  } else if (job.status === "succeeded") {
+    feedbackEl.textContent = job.message || "OK";
+    feedbackEl.style.color = "green";
+  } else if (job.status === "cancelled") {
+    feedbackEl.textContent = job.message || "Annulleret";
+    feedbackEl.style.color = "orange";
+  } else {
+    feedbackEl.textContent = job.progress || (job.status === "running" ? `${job.action} kører…` : `${job.action} i kø…`);
+    feedbackEl.style.color = "gray";
+  }
+}
+
+// Job-status pushes over /events websocket'en (åbnet i init)
+eventHandlers.job = showJob;
+
+async function fetchJob(id, jobId) {
+  const res = await fetch(`/api/robots/${encodeURIComponent(id)}/jobs/${jobId}`);
+  const job = await res.json();
+  showJob(job);
+  return job;
+}
+
+// Uden websocket: poll jobbet indtil det er færdigt
+async function pollJob(id, jobId) {
+  while (currentJob === jobId && !currentJobDone) {
+    await fetchJob(id, jobId);
+    await new Promise(r => setTimeout(r, 1000));
+  }
+}
+
 async function callDemo(id, action) {
   try {
     const res = await fetch(`/api/robots/${encodeURIComponent(id)}/demo/${action}`, {
       method: 'POST'
     });
     const data = await res.json();
-    feedbackEl.textContent = data.message || data.error || "OK";
-    feedbackEl.style.color = data.error ? "red" : "green";
+    if (data.error) {
+      feedbackEl.textContent = data.error;
+      feedbackEl.style.color = "red";
+      return;
+    }
+    currentJob = data.job_id;
+    currentJobDone = false;
+    feedbackEl.textContent = data.message || "I kø…";
+    feedbackEl.style.color = "gray";
+    // Hurtige jobs kan være færdige før vi kendte job-id'et – hent status én gang
+    if (window.WebSocket) fetchJob(id, currentJob);
+    else pollJob(id, currentJob);
   } catch (e) {
     feedbackEl.textContent = "Fejl: " + e.message;
     feedbackEl.style.color = "red";